@@ -0,0 +1,183 @@
+import argparse
+import itertools
+import json
+import resource
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from ept import EPT
+from ept_s3 import build_season
+from rank_encoding import RankEncoding
+from solver_config import SolverConfig
+from synthetic_season import SyntheticSeason
+from threshold_search import ThresholdSearch
+
+
+class BenchmarkCase:
+    def __init__(self, name: str, season: SyntheticSeason = None):
+        self.name = name
+        # None is the real EPT Season 3 fixtures (DreamLeague Season 24 and ESL One Bangkok 2024)
+        self.season = season
+
+    def build(self, rank_encoding: RankEncoding) -> EPT:
+        if self.season is None:
+            return build_season(rank_encoding)
+        return self.season.build(rank_encoding)
+
+    def definition(self) -> dict:
+        if self.season is None:
+            return {"season": "ept_s3"}
+        return self.season.definition()
+
+
+def peak_rss_kb() -> int:
+    # Kilobytes on Linux (bytes on macOS), and only ever goes up, hence one fresh process per case
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(case: BenchmarkCase, rank_encoding: RankEncoding, mode: str, top_n: int,
+             solver_config: SolverConfig, exact: bool = False) -> dict:
+    rss_before_build_kb = peak_rss_kb()
+
+    start = time.perf_counter()
+    ept = case.build(rank_encoding)
+    season_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    threshold_search = ThresholdSearch(ept=ept, top_n=top_n, solver_config=solver_config, exact=exact)
+    build_seconds = time.perf_counter() - start
+    proto = threshold_search.template.model.proto
+
+    start = time.perf_counter()
+    solver_config.start()
+    if mode == "single":
+        results = threshold_search.run_single()
+    else:
+        results = threshold_search.run(ept.team_database.get_all_teams())
+    solve_seconds = time.perf_counter() - start
+    max_result = threshold_search.best(results)
+
+    statuses: dict[str, int] = {}
+    for result in results:
+        status = "SKIPPED" if result.skipped else result.status.name
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        # The exact engine only runs when asked for and applicable, and hands over to CP-SAT if it gives up
+        "engine": "exact" if threshold_search.exact_threshold is not None else "cp_sat",
+        "teams": len(ept.team_database.get_all_teams()),
+        "variables": len(proto.variables),
+        "constraints": len(proto.constraints),
+        "season_seconds": season_seconds,
+        "build_seconds": build_seconds,
+        "solve_seconds": solve_seconds,
+        "rss_before_build_kb": rss_before_build_kb,
+        "peak_rss_kb": peak_rss_kb(),
+        "statuses": statuses,
+        "threshold": None if max_result is None else max_result.objective_value,
+        "team": None if max_result is None else max_result.team_name
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record_key(record: dict) -> (str, str, str, int, str):
+    # Records without an engine are taken to be CP-SAT's, as they were before the exact engine
+    return record["case"], record["rank_encoding"], record["mode"], record["top_n"], record.get("engine", "cp_sat")
+
+
+def compare(base_path: str, records: [dict]):
+    # Against the latest record of each case in the base file, e.g. one written at another commit
+    base_records: dict = {}
+    with open(base_path) as base_file:
+        for line in base_file:
+            base_record = json.loads(line)
+            base_records[record_key(base_record)] = base_record
+
+    print(f"{'case':<50} {'build':>8} {'solve':>8} {'memory':>8} {'variables':>10}")
+    for record in records:
+        base_record = base_records.get(record_key(record))
+        if base_record is None:
+            print(f"{record['case']:<50} {'(new)':>8}")
+            continue
+        print(f"{record['case']:<50} "
+              f"{record['build_seconds'] / max(base_record['build_seconds'], 1e-9):>7.2f}x "
+              f"{record['solve_seconds'] / max(base_record['solve_seconds'], 1e-9):>7.2f}x "
+              f"{record['peak_rss_kb'] / max(base_record['peak_rss_kb'], 1):>7.2f}x "
+              f"{record['variables'] - base_record['variables']:>+10}")
+
+
+def benchmark_cases(args: argparse.Namespace) -> [BenchmarkCase]:
+    cases = [] if args.skip_real else [BenchmarkCase(name="ept_s3")]
+    for team_count, events, known_fraction, seed in itertools.product(args.teams, args.events, args.known, args.seeds):
+        # e.g. "16:2,12:1" is a 16 team event with two group stages followed by a 12 team event with one
+        events = [event.split(":") for event in events.split(",")]
+        season = SyntheticSeason(team_count=team_count,
+                                 event_sizes=[int(event_size) for event_size, _ in events],
+                                 group_stages=[int(group_stages) for _, group_stages in events],
+                                 known_fraction=known_fraction,
+                                 seed=seed)
+        cases.append(BenchmarkCase(name=season.name(), season=season))
+    return cases
+
+
+def main(args: argparse.Namespace):
+    solver_config = SolverConfig.from_args(args)
+    if solver_config.time_limit is None:
+        # Barely known seasons can take far longer than the real one to prove, so cap each solve unless told otherwise
+        solver_config.time_limit = 60
+    commit = git_commit()
+    records = []
+    for case in benchmark_cases(args):
+        print(f"Benchmarking {case.name}")
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            metrics = executor.submit(run_case, case, args.rank_encoding, args.mode, args.top_n,
+                                      solver_config, args.exact).result()
+        record = {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "case": case.name,
+            "definition": case.definition(),
+            "rank_encoding": args.rank_encoding.value,
+            "mode": args.mode,
+            "top_n": args.top_n,
+            **metrics
+        }
+        print(f"Built {record['variables']} variables in {record['build_seconds']:.2f}s, "
+              f"solved in {record['solve_seconds']:.2f}s, peak {record['peak_rss_kb']} KB")
+        records.append(record)
+        with open(args.output, "a") as output_file:
+            output_file.write(json.dumps(record) + "\n")
+
+    if args.compare is not None:
+        compare(args.compare, records)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and size the season model on the real and synthetic seasons")
+    parser.add_argument("--teams", type=int, nargs="+", default=[22, 44], help="Teams in each synthetic season")
+    parser.add_argument("--events", nargs="+", default=["16:2,12:1", "24:2,16:1", "16:2,12:1,16:2,12:1,16:2,12:1"],
+                        help="Comma-separated teams:group stages of each event, one season per entry")
+    parser.add_argument("--known", type=float, nargs="+", default=[0.3, 0.6, 1.0],
+                        help="Fraction of each season's stages whose results are known")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--skip-real", action="store_true", help="Leave out the real EPT Season 3 fixtures")
+    parser.add_argument("--rank-encoding", type=RankEncoding, choices=list(RankEncoding), default=RankEncoding.BIG_M)
+    parser.add_argument("--mode", choices=["single", "per-team"], default="single",
+                        help="One threshold solve, or one solve per team as ept_s3.py does by default")
+    parser.add_argument("--top-n", type=int, default=4)
+    parser.add_argument("--exact", action="store_true",
+                        help="Use the exact engine where at most one tournament is still open, rather than CP-SAT")
+    parser.add_argument("--output", default="benchmark_results.jsonl", help="JSON lines file to append results to")
+    parser.add_argument("--compare", help="Earlier results file to compare this run against")
+    SolverConfig.add_arguments(parser)
+
+    main(parser.parse_args())
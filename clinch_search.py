@@ -0,0 +1,154 @@
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from ortools.sat.python import cp_model
+from ortools.sat.python.cp_model import CpSolverStatus
+
+from ept import EPT
+from profiler import Profiler
+from solution import solution_value
+from solver_config import SolverConfig
+from teams import Team
+from threshold_search import ModelTemplate, new_template_pool, run_in_worker, split_cores
+
+
+def possible(status: CpSolverStatus) -> bool:
+    return status in [cp_model.OPTIMAL, cp_model.FEASIBLE]
+
+
+class ClinchResult:
+    # Picklable answers to whether a team can still finish outside and inside the top N
+    def __init__(self, team_name: str, top_n: int, outside: CpSolverStatus, inside: CpSolverStatus):
+        self.team_name = team_name
+        self.top_n = top_n
+        self.outside = outside
+        self.inside = inside
+
+    def standing(self) -> str:
+        if self.inside == cp_model.INFEASIBLE:
+            return "Eliminated"
+        if self.outside == cp_model.INFEASIBLE:
+            return "Clinched"
+        if possible(self.outside) and possible(self.inside):
+            return "Alive"
+        return "Unknown"
+
+
+class ClinchSearch:
+    # Two feasibility checks per team and cutoff, with no objective to prove: can it finish outside the top N, and
+    # can it finish inside it? Every check is a clone of the one shared template
+    def __init__(self, ept: EPT, workers: int = 1, solver_config: SolverConfig = None, profiler: Profiler = None):
+        self.ept = ept
+        self.workers = workers
+        self.solver_config = SolverConfig() if solver_config is None else solver_config
+        self.profiler = Profiler() if profiler is None else profiler
+        self.template = ModelTemplate(ept, self.profiler)
+        # Answers so far, by (team name, top N, inside)
+        self.statuses: dict[(str, int, bool), CpSolverStatus] = {}
+        self.top_ns: [int] = []
+
+    def run(self, teams: [Team], top_ns: [int]) -> dict[int, [ClinchResult]]:
+        self.solver_config.start()
+        self.statuses = {}
+        self.top_ns = sorted(set(top_ns))
+        checks = [(team.name, top_n, inside) for top_n in self.top_ns for team in teams for inside in [False, True]]
+        if self.workers <= 1:
+            self.run_sequential(checks)
+        else:
+            self.run_parallel(checks)
+
+        return {top_n: [ClinchResult(team_name=team.name, top_n=top_n,
+                                     outside=self.statuses.get((team.name, top_n, False), cp_model.UNKNOWN),
+                                     inside=self.statuses.get((team.name, top_n, True), cp_model.UNKNOWN))
+                        for team in teams]
+                for top_n in self.top_ns}
+
+    def run_sequential(self, checks: [(str, int, bool)]):
+        for team_name, top_n, inside in checks:
+            if self.answered(team_name, top_n, inside):
+                continue
+            [status, solution] = check_team(self.ept, self.template, team_name, top_n, inside, self.solver_config,
+                                            self.profiler)
+            self.record(team_name, top_n, inside, status, solution)
+
+    def run_parallel(self, checks: [(str, int, bool)]):
+        solver_config = split_cores(self.solver_config, self.workers)
+        with new_template_pool(self.ept, self.template, self.workers, self.profiler) as executor:
+            remaining = deque(checks)
+            pending = {}
+            while remaining or pending:
+                # Only keep as many checks in flight as there are workers, so later ones can be answered by the
+                # scenarios earlier ones find instead of being solved
+                while remaining and len(pending) < self.workers:
+                    check = remaining.popleft()
+                    if not self.answered(*check):
+                        pending[executor.submit(run_in_worker, check_team, *check, solver_config)] = check
+
+                if not pending:
+                    continue
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    [status, solution] = future.result()
+                    self.record(*pending.pop(future), status, solution)
+
+    def answered(self, team_name: str, top_n: int, inside: bool) -> bool:
+        return self.statuses.get((team_name, top_n, inside), cp_model.UNKNOWN) != cp_model.UNKNOWN
+
+    def record(self, team_name: str, top_n: int, inside: bool, status: CpSolverStatus, solution: [int]):
+        if not self.answered(team_name, top_n, inside):
+            self.statuses[(team_name, top_n, inside)] = status
+
+        if status == cp_model.INFEASIBLE:
+            # Finishing outside a top N is no harder than outside a bigger one, and inside a top N no harder than
+            # inside a smaller one
+            for other_top_n in self.top_ns:
+                if other_top_n < top_n if inside else other_top_n > top_n:
+                    self.statuses[(team_name, other_top_n, inside)] = cp_model.INFEASIBLE
+            return
+
+        if not possible(status):
+            return
+
+        # The scenario places every team, so it answers one of the two questions for every team and cutoff. Ties
+        # count against a team, as in the model
+        totals = [solution_value(solution, total_points)
+                  for total_points in self.template.unoptimised_model.total_points]
+        for team in self.ept.team_database.get_all_teams():
+            team_total = totals[self.ept.team_database.get_team_index(team)]
+            rank = sum(1 for total in totals if total >= team_total)
+            for other_top_n in self.top_ns:
+                if not self.answered(team.name, other_top_n, rank <= other_top_n):
+                    self.statuses[(team.name, other_top_n, rank <= other_top_n)] = status
+
+    @staticmethod
+    def table(results_by_top_n: dict[int, [ClinchResult]]) -> str:
+        top_ns = sorted(results_by_top_n)
+        team_names = [result.team_name for result in results_by_top_n[top_ns[0]]]
+        width = max(len(team_name) for team_name in team_names + ["Team"])
+        standings: dict[(str, int), str] = {(result.team_name, top_n): result.standing()
+                                            for top_n in top_ns for result in results_by_top_n[top_n]}
+
+        lines = [f"{'Team':<{width}}" + "".join(f"  {'Top ' + str(top_n):<10}" for top_n in top_ns)]
+        for team_name in team_names:
+            lines.append(f"{team_name:<{width}}" + "".join(f"  {standings[(team_name, top_n)]:<10}"
+                                                           for top_n in top_ns))
+        return "\n".join(line.rstrip() for line in lines)
+
+
+def check_team(ept: EPT, template: ModelTemplate, team_name: str, top_n: int, inside: bool,
+               solver_config: SolverConfig = None, profiler: Profiler = None):
+    # [status, solution], with the solution empty unless a scenario was found
+    if solver_config is not None and solver_config.out_of_time():
+        print(f"Skipping {team_name} as the global time limit has been reached")
+        return [cp_model.UNKNOWN, []]
+
+    team = ept.team_database.get_team_by_name(team_name)
+    print(f"Now checking whether {team.name} can finish {'inside' if inside else 'outside'} of top {top_n}")
+    return ept.check_for(team=team,
+                         unoptimised_model=template.unoptimised_model,
+                         model=template.model,
+                         top_n=top_n,
+                         inside=inside,
+                         solver_config=solver_config,
+                         profiler=profiler)
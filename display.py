@@ -1,40 +1,15 @@
-from struct import Struct
-
-from ortools.sat.python.cp_model import CpSolver
-
-from teams import TeamDatabase, Team
+from snapshot import Snapshot
+from teams import Team
 from tournament import SolvedTournament
 from transfer_window import TransferWindow
-from unoptimised_model import UnoptimisedModel, UnoptimisedTournamentModel
 
 
 class TeamRow:
-    def __init__(self, team_name: str, total_points: int,
-                 dreamleague_season_24_final_placement_place: int,
-                 dreamleague_season_24_final_placement_points: int,
-                 dreamleague_season_24_gs1_place: int,
-                 dreamleague_season_24_gs1_points: int,
-                 dreamleague_season_24_gs2_place: int,
-                 dreamleague_season_24_gs2_points: int,
-                 between_dreamleague_season_24_esl_one_bangkok: int,
-                 esl_one_bangkok_2024_final_placement_place: int,
-                 esl_one_bangkok_2024_final_placement_points: int,
-                 esl_one_bangkok_2024_gs1_place: int,
-                 esl_one_bangkok_2024_gs1_points: int,
-                 ):
+    def __init__(self, team_name: str, total_points: int, cells: [str]):
         self.team_name = team_name
         self.total_points = total_points
-        self.dreamleague_season_24_final_placement_place = dreamleague_season_24_final_placement_place
-        self.dreamleague_season_24_final_placement_points = dreamleague_season_24_final_placement_points
-        self.dreamleague_season_24_gs1_place = dreamleague_season_24_gs1_place
-        self.dreamleague_season_24_gs1_points = dreamleague_season_24_gs1_points
-        self.dreamleague_season_24_gs2_place = dreamleague_season_24_gs2_place
-        self.dreamleague_season_24_gs2_points = dreamleague_season_24_gs2_points
-        self.between_dreamleague_season_24_esl_one_bangkok = between_dreamleague_season_24_esl_one_bangkok
-        self.esl_one_bangkok_2024_final_placement_place = esl_one_bangkok_2024_final_placement_place
-        self.esl_one_bangkok_2024_final_placement_points = esl_one_bangkok_2024_final_placement_points
-        self.esl_one_bangkok_2024_gs1_place = esl_one_bangkok_2024_gs1_place
-        self.esl_one_bangkok_2024_gs1_points = esl_one_bangkok_2024_gs1_points
+        # One formatted cell per tournament stage and transfer window, in season order
+        self.cells = cells
 
 
 class Display:
@@ -42,36 +17,25 @@ class Display:
               team_to_optimise: Team,
               max_points: float,
               top_n: int,
-              unoptimised_model: UnoptimisedModel,
-              solver: CpSolver,
-              dreamleague_season_24: SolvedTournament,
-              between_dreamleague_season_24_esl_one_bangkok: TransferWindow,
-              esl_one_bangkok_2024: SolvedTournament,
-              team_database: TeamDatabase) -> str:
+              snapshot: Snapshot,
+              events: [SolvedTournament | TransferWindow]) -> str:
+        def formatted_points(place: int, points: int) -> str:
+            # Transfer windows and teams not taking part have no placement, and placements that score nothing are not
+            # highlighted
+            if place < 0 or place > 3 or points == 0:
+                return f"{points}"
+
+            return f"{{{{PlacementBg/{place + 1}}}}} {points}"
+
         team_rows = []
-        i = 0
-        for team in team_database.get_all_teams():
-            dreamleague_season_24_final_placement_points = solver.Value(unoptimised_model.dreamleague_season_24.points[i])
-            dreamleague_season_24_gs1_points = solver.Value(unoptimised_model.dreamleague_season_24.gs1_points[i])
-            dreamleague_season_24_gs2_points = solver.Value(unoptimised_model.dreamleague_season_24.gs2_points[i])
-            esl_one_bangkok_2024_final_placement_points = solver.Value(unoptimised_model.esl_one_bangkok_2024.points[i])
-            esl_one_bangkok_2024_gs1_points = solver.Value(unoptimised_model.esl_one_bangkok_2024.gs1_points[i])
+        totals = snapshot.totals()
+        for i, team_name in enumerate(snapshot.team_names):
             team_rows.append(TeamRow(
-                team_name=team.name,
-                total_points=solver.Value(unoptimised_model.total_points[i]),
-                dreamleague_season_24_final_placement_place=dreamleague_season_24.points_to_place(dreamleague_season_24_final_placement_points),
-                dreamleague_season_24_final_placement_points=dreamleague_season_24_final_placement_points,
-                dreamleague_season_24_gs1_place=dreamleague_season_24.gs1_points_to_place(dreamleague_season_24_gs1_points),
-                dreamleague_season_24_gs1_points=dreamleague_season_24_gs1_points,
-                dreamleague_season_24_gs2_place=dreamleague_season_24.gs2_points_to_place(dreamleague_season_24_gs2_points),
-                dreamleague_season_24_gs2_points=dreamleague_season_24_gs2_points,
-                between_dreamleague_season_24_esl_one_bangkok=between_dreamleague_season_24_esl_one_bangkok.as_table()[i],
-                esl_one_bangkok_2024_final_placement_place=esl_one_bangkok_2024.points_to_place(esl_one_bangkok_2024_final_placement_points),
-                esl_one_bangkok_2024_final_placement_points=esl_one_bangkok_2024_final_placement_points,
-                esl_one_bangkok_2024_gs1_place=esl_one_bangkok_2024.gs1_points_to_place(esl_one_bangkok_2024_gs1_points),
-                esl_one_bangkok_2024_gs1_points=esl_one_bangkok_2024_gs1_points
+                team_name=team_name,
+                total_points=int(totals[i]),
+                cells=[formatted_points(int(place), int(points))
+                       for points, place in zip(snapshot.points[i], snapshot.places[i])]
             ))
-            i += 1
 
         sorted_team_rows = sorted(team_rows, key=lambda team_row: team_row.total_points, reverse=True)
 
@@ -82,25 +46,19 @@ class Display:
         output += "! rowspan=\"2\" style=\"min-width:40px\" | '''Place'''\n"
         output += "! rowspan=\"2\" style=\"min-width:200px\" | '''Team'''\n"
         output += "! style=\"min-width:50px\" | '''Point'''\n"
-        output += f"! colspan=\"{unoptimised_model.dreamleague_season_24.points_scoring_phases}\" style=\"min-width:50px\" | {unoptimised_model.dreamleague_season_24.icon}\n"
-        output += "! rowspan=\"2\" | <span title=\"Point changes between DreamLeague Season 24 and ESL One Bangkok\">&hArr;</span>\n"
-        output += f"! colspan=\"{unoptimised_model.esl_one_bangkok_2024.points_scoring_phases}\" style=\"min-width:50px\" | {unoptimised_model.esl_one_bangkok_2024.icon}\n"
+        for e, event in enumerate(events):
+            if isinstance(event, TransferWindow):
+                output += f"! rowspan=\"2\" | <span title=\"{self.transfer_window_title(events, e)}\">&hArr;</span>\n"
+            else:
+                output += f"! colspan=\"{snapshot.event_columns[e]}\" style=\"min-width:50px\" | {event.icon}\n"
         output += "|-\n"
         output += f"! '''{(round(max_points) + 1)}'''\n"
-        output = self.display_phases_header(output, unoptimised_model.dreamleague_season_24)
-        output = self.display_phases_header(output, unoptimised_model.esl_one_bangkok_2024)
+        for event, event_columns in zip(events, snapshot.event_columns):
+            if isinstance(event, SolvedTournament):
+                output = self.display_phases_header(output, event_columns)
         output += "|-\n"
         i = 0
 
-        def formatted_points(place: int, points: int | None) -> str:
-            if place is None:
-                return f"{points}"
-
-            if place > 3:
-                return f"{points}"
-
-            return f"{{{{PlacementBg/{place + 1}}}}} {points}"
-
         for sorted_team_row in sorted_team_rows:
             if i == 8:
                 output += "|-\n"
@@ -109,26 +67,32 @@ class Display:
             output += f"| {(i + 1)}\n"
             output += f"|style=\"text-align: left;\"| {{{{Team|{sorted_team_row.team_name}}}}}\n"
             output += f"| {sorted_team_row.total_points}\n"
-            output += f"| {formatted_points(sorted_team_row.dreamleague_season_24_final_placement_place, sorted_team_row.dreamleague_season_24_final_placement_points)}\n"
-            output += f"| {formatted_points(sorted_team_row.dreamleague_season_24_gs1_place, sorted_team_row.dreamleague_season_24_gs1_points)}\n"
-            output += f"| {formatted_points(sorted_team_row.dreamleague_season_24_gs2_place, sorted_team_row.dreamleague_season_24_gs2_points)}\n"
-            output += f"| {sorted_team_row.between_dreamleague_season_24_esl_one_bangkok}\n"
-            output += f"| {formatted_points(sorted_team_row.esl_one_bangkok_2024_final_placement_place, sorted_team_row.esl_one_bangkok_2024_final_placement_points)}\n"
-            output += f"| {formatted_points(sorted_team_row.esl_one_bangkok_2024_gs1_place, sorted_team_row.esl_one_bangkok_2024_gs1_points)}\n"
+            for cell in sorted_team_row.cells:
+                output += f"| {cell}\n"
             output += "|-\n"
             i += 1
         output += "|}"
 
         return output
 
-    def display_phases_header(self, output, tournament: UnoptimisedTournamentModel):
-        if tournament.points_scoring_phases == 1:
+    @staticmethod
+    def transfer_window_title(events: [SolvedTournament | TransferWindow], e: int) -> str:
+        if events[e].title is not None:
+            return events[e].title
+
+        previous_tournaments = [event.name for event in events[:e] if isinstance(event, SolvedTournament)]
+        next_tournaments = [event.name for event in events[e + 1:] if isinstance(event, SolvedTournament)]
+        return f"Point changes between {previous_tournaments[-1] if previous_tournaments else 'the start'} and " \
+               f"{next_tournaments[0] if next_tournaments else 'the end'}"
+
+    def display_phases_header(self, output, points_scoring_phases: int):
+        if points_scoring_phases == 1:
             output += "! {{Abbr|Fin|Final position}}\n"
-        elif tournament.points_scoring_phases == 2:
+        elif points_scoring_phases == 2:
             output += "! {{Abbr|Fin|Final position}} || GS1\n"
-        elif tournament.points_scoring_phases == 3:
+        elif points_scoring_phases == 3:
             output += "! {{Abbr|Fin|Final position}} || GS1 || GS2\n"
         else:
             raise Exception(
-                f"Unknown number of points scoring phases {tournament.points_scoring_phases}")
+                f"Unknown number of points scoring phases {points_scoring_phases}")
         return output
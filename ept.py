@@ -1,68 +1,340 @@
 from ortools.constraint_solver.pywrapcp import BooleanVar
 from ortools.sat.python import cp_model
-from ortools.sat.python.cp_model import CpModel, IntVar
+from ortools.sat.python.cp_model import CpModel, IntVar, LinearExprT
 
+from profiler import Profiler
+from rank_encoding import RankEncoding
+from solution import solution_value
+from solver_config import SolverConfig
 from teams import TeamDatabase, Team
 from tournament import SolvedTournament
 from transfer_window import TransferWindow
-from unoptimised_model import UnoptimisedModel
+from unoptimised_model import UnoptimisedModel, UnoptimisedTournamentModel
 
 
 class EPT:
     def __init__(self,
-                 dreamleague_season_24: SolvedTournament,
-                 between_dreamleague_season_24_esl_one_bangkok: TransferWindow,
-                 esl_one_bangkok_2024: SolvedTournament,
-                 team_database: TeamDatabase):
-        self.dreamleague_season_24 = dreamleague_season_24
-        self.between_dreamleague_season_24_esl_one_bangkok = between_dreamleague_season_24_esl_one_bangkok
-        self.esl_one_bangkok_2024 = esl_one_bangkok_2024
+                 events: [SolvedTournament | TransferWindow],
+                 team_database: TeamDatabase,
+                 rank_encoding: RankEncoding = RankEncoding.BIG_M):
+        # Tournaments and the transfer windows between them, in the order they happen
+        self.events = events
         self.team_database = team_database
+        self.rank_encoding = rank_encoding
 
-    def add_constraints(self, model: CpModel) -> UnoptimisedModel:
-        dreamleague_season_24 = self.dreamleague_season_24.add_constraints(model)
-        esl_one_bangkok_2024 = self.esl_one_bangkok_2024.add_constraints(model)
+    def tournaments(self) -> [SolvedTournament]:
+        return [event for event in self.events if isinstance(event, SolvedTournament)]
 
-        team_count = len(self.team_database.get_all_teams())
-        team_count_range = range(team_count)
-        total_points = [model.NewIntVar(0, 99999, f'd_{i}') for i in team_count_range]
-        for t in self.team_database.get_all_teams():
-            team_index = self.team_database.get_team_index(t)
-            total_points[team_index] = dreamleague_season_24.points[team_index] + \
-                                       dreamleague_season_24.gs1_points[team_index] + \
-                                       dreamleague_season_24.gs2_points[team_index] + \
-                                       self.between_dreamleague_season_24_esl_one_bangkok.as_table()[team_index] + \
-                                       esl_one_bangkok_2024.points[team_index] + \
-                                       esl_one_bangkok_2024.gs1_points[team_index]
+    def definition(self) -> dict:
+        return {
+            "teams": [team.name for team in self.team_database.get_all_teams()],
+            "events": [event.definition() for event in self.events],
+            "rank_encoding": self.rank_encoding.value
+        }
+
+    def add_constraints(self, model: CpModel, profiler: Profiler = None) -> UnoptimisedModel:
+        profiler = Profiler() if profiler is None else profiler
+        events: [UnoptimisedTournamentModel | TransferWindow] = []
+        for event in self.events:
+            if isinstance(event, SolvedTournament):
+                with profiler.phase("build_tournament", tournament=event.name):
+                    events.append(event.add_constraints(model))
+            else:
+                events.append(event)
+
+        with profiler.phase("build_total_points", events=len(events)):
+            total_points = self.total_points(events)
+            total_domains = self.total_domains(events)
 
         # Ranks
-        aux: [[BooleanVar]] = {(i, j): model.NewBoolVar(f'aux_{i}_{j}') for i in team_count_range for j in
-                               team_count_range}
-        ranks: [IntVar] = {team: model.NewIntVar(1, team_count, f'ranks_{team}') for team in team_count_range}
-        big_m: int = 20000
+        # The counting encoding only needs the totals; the target team's comparisons are added per solve
+        ranks = None
+        if self.rank_encoding == RankEncoding.BIG_M:
+            with profiler.phase("build_ranks", rank_encoding=self.rank_encoding.value):
+                ranks = self.add_rank_constraints(model, total_points, total_domains)
+
+        return UnoptimisedModel(events=events, total_points=total_points, total_domains=total_domains, ranks=ranks)
+
+    def total_points(self, events: [UnoptimisedTournamentModel | TransferWindow]) -> [LinearExprT]:
+        # One pass over every stage of every event, so each team's total is a single flat weighted sum of its
+        # placement indicators plus its transfer window changes, however many events there are
+        team_count = len(self.team_database.get_all_teams())
+        variables: [[BooleanVar]] = [[] for _ in range(team_count)]
+        coefficients: [[int]] = [[] for _ in range(team_count)]
+        constants: [int] = [0] * team_count
+        for event in events:
+            if isinstance(event, TransferWindow):
+                for i, change in enumerate(event.as_table()):
+                    constants[i] += change
+                continue
+
+            for indicators, _, buckets in event.stages():
+                for i in range(team_count):
+                    for b, bucket in enumerate(buckets):
+                        # Placements settled when the tournament was built are plain ints
+                        if isinstance(indicators[i][b], int):
+                            constants[i] += indicators[i][b] * bucket.points
+                        elif bucket.points != 0:
+                            variables[i].append(indicators[i][b])
+                            coefficients[i].append(bucket.points)
+        # Teams with nothing left open have a plain int total
+        return [cp_model.LinearExpr.weighted_sum(variables[i], coefficients[i]) + constants[i]
+                if len(variables[i]) > 0 else constants[i]
+                for i in range(team_count)]
+
+    def total_domains(self, events: [UnoptimisedTournamentModel | TransferWindow]) -> [cp_model.Domain]:
+        # Every total each team can still reach, from the point values left open to it in each stage. Stages are
+        # combined as if they were independent, so a few of these may not be reachable, but none are missing. Each
+        # team's reachable totals are the set bits of an int (offset by its transfer window changes), so adding a
+        # stage is a few shifts
+        team_count = len(self.team_database.get_all_teams())
+        reachable: [int] = [1] * team_count
+        offsets: [int] = [0] * team_count
+        for event in events:
+            if isinstance(event, TransferWindow):
+                for i, change in enumerate(event.as_table()):
+                    offsets[i] += change
+                continue
+
+            for indicators, _, buckets in event.stages():
+                for i in range(team_count):
+                    settled = [bucket.points for indicator, bucket in zip(indicators[i], buckets)
+                               if isinstance(indicator, int) and indicator == 1]
+                    if len(settled) > 0:
+                        values = set(settled)
+                    else:
+                        # A row with nothing settled may also be left empty
+                        values = {0} | {bucket.points for indicator, bucket in zip(indicators[i], buckets)
+                                        if not isinstance(indicator, int)}
+                    stage_reachable = 0
+                    for value in values:
+                        stage_reachable |= reachable[i] << value
+                    reachable[i] = stage_reachable
+
+        total_domains: [cp_model.Domain] = []
+        for i in range(team_count):
+            totals = [offsets[i] + total for total, bit in enumerate(reversed(bin(reachable[i])[2:])) if bit == "1"]
+            total_domains.append(cp_model.Domain.from_values(totals))
+        return total_domains
+
+    def add_rank_constraints(self, model: CpModel, total_points: [IntVar],
+                             total_domains: [cp_model.Domain]) -> [IntVar]:
+        team_count = len(self.team_database.get_all_teams())
+        team_count_range = range(team_count)
+        lowest = [total_domain.min() for total_domain in total_domains]
+        highest = [total_domain.max() for total_domain in total_domains]
+        # Pairs whose totals cannot cross (which takes in two constant totals, and a team against itself) compare the
+        # same way in every scenario, so only the others get a variable. Ties count against a team, as with the
+        # counting encoding
+        aux: [[BooleanVar]] = {(i, j): int(i == j or lowest[j] >= highest[i])
+                               if i == j or lowest[j] >= highest[i] or lowest[i] > highest[j] else
+                               model.NewBoolVar(f'aux_{i}_{j}')
+                               for i in team_count_range for j in team_count_range}
+        ranks: [IntVar] = {}
         for i in team_count_range:
             for j in team_count_range:
-                if i == j:
-                    model.Add(aux[(i, j)] == 1)
-                else:
-                    model.Add(total_points[i] - total_points[j] <= (1 - aux[(i, j)]) * big_m)
-                    model.Add(total_points[j] - total_points[i] <= aux[(i, j)] * big_m)
+                if not isinstance(aux[(i, j)], int):
+                    # Each big-M is the widest gap the two totals can actually have
+                    model.Add(total_points[i] - total_points[j] <= (1 - aux[(i, j)]) * (highest[i] - lowest[j]))
+                    model.Add(total_points[j] - total_points[i] <= aux[(i, j)] * (highest[j] - lowest[i]))
             ranks[i] = sum(aux[(i, j)] for j in team_count_range)
+        return ranks
+
+    def add_outside_top_n(self, model: CpModel, unoptimised_model: UnoptimisedModel, team_index: int,
+                          top_n: int) -> [BooleanVar]:
+        if self.rank_encoding == RankEncoding.BIG_M:
+            model.Add(unoptimised_model.ranks[team_index] > top_n)
+            return []
+
+        # At least top_n other teams finish level with or ahead of this team (ties count against it, as with ranks)
+        total_points = unoptimised_model.total_points
+        at_least_as_high: [BooleanVar] = []
+        for j in range(len(total_points)):
+            if j == team_index:
+                continue
+            if isinstance(total_points[j], int) and isinstance(total_points[team_index], int):
+                # Both totals are settled, so the comparison is too
+                at_least_as_high.append(int(total_points[j] >= total_points[team_index]))
+                continue
+            at_least = model.NewBoolVar(f'at_least_{j}_{team_index}')
+            model.Add(total_points[j] >= total_points[team_index]).only_enforce_if(at_least)
+            at_least_as_high.append(at_least)
+        model.Add(sum(at_least_as_high) >= top_n)
+        return at_least_as_high
 
-        return UnoptimisedModel(dreamleague_season_24=dreamleague_season_24,
-                                between_dreamleague_season_24_esl_one_bangkok=self.between_dreamleague_season_24_esl_one_bangkok,
-                                esl_one_bangkok_2024=esl_one_bangkok_2024,
-                                total_points=total_points,
-                                ranks=ranks)
+    @staticmethod
+    def add_inside_top_n(model: CpModel, unoptimised_model: UnoptimisedModel, team_index: int, top_n: int):
+        # Fewer than top_n other teams level with or ahead of this team, so all the rest strictly behind it. This holds
+        # for either rank encoding, as the big-M ranks leave the comparison between two tied totals free, which would
+        # count a tie in the team's favour
+        total_points = unoptimised_model.total_points
+        behind: [BooleanVar] = []
+        for j in range(len(total_points)):
+            if j == team_index:
+                continue
+            if isinstance(total_points[j], int) and isinstance(total_points[team_index], int):
+                behind.append(int(total_points[j] < total_points[team_index]))
+                continue
+            strictly_behind = model.NewBoolVar(f'behind_{j}_{team_index}')
+            model.Add(total_points[j] < total_points[team_index]).only_enforce_if(strictly_behind)
+            behind.append(strictly_behind)
+        model.Add(sum(behind) >= len(total_points) - top_n)
 
-    def optimise_for(self, team: Team, unoptimised_model: UnoptimisedModel, model: CpModel, top_n):
+    @staticmethod
+    def add_hint(model: CpModel, template_variable_count: int, unoptimised_model: UnoptimisedModel, team_index: int,
+                 at_least_as_high: [BooleanVar], hint: [int]):
+        # Start from the previous team's scenario: every template variable, which covers all tournaments' indicators
+        for index in range(template_variable_count):
+            model.AddHint(model.get_int_var_from_proto_index(index), hint[index])
+
+        # The comparisons against the new team did not exist in the previous solve, so derive them from the hinted
+        # totals. If the new team ends up inside the top N, CP-SAT repairs the rest of the hint
+        total_points = unoptimised_model.total_points
+        hinted_total = solution_value(hint, total_points[team_index])
+        other_team_indices = [j for j in range(len(total_points)) if j != team_index]
+        for j, at_least in zip(other_team_indices, at_least_as_high):
+            if not isinstance(at_least, int):
+                model.AddHint(at_least, solution_value(hint, total_points[j]) >= hinted_total)
+
+    def max_points_obtainable(self, team: Team) -> int:
         team_index = self.team_database.get_team_index(team)
-        model.Add(unoptimised_model.ranks[team_index] > top_n)
-        model.Maximize(unoptimised_model.total_points[team_index])
+        max_points = 0
+        for event in self.events:
+            if isinstance(event, SolvedTournament):
+                max_points += event.max_points_obtainable(team)
+            else:
+                max_points += event.as_table()[team_index]
+        return max_points
 
+    def optimise_for(self, team: Team, unoptimised_model: UnoptimisedModel, model: CpModel, top_n,
+                     solver_config: SolverConfig = None, hint: [int] = None, cutoff: int = None,
+                     profiler: Profiler = None, conditions: [[int]] = None, changes: [int] = None):
+        profiler = Profiler() if profiler is None else profiler
         solver = cp_model.CpSolver()
-        status = solver.Solve(model)
-        if status != cp_model.OPTIMAL:
+        (SolverConfig() if solver_config is None else solver_config).apply(solver)
+        with profiler.phase("build_team_model", team=team.name):
+            # Only the rank constraint and the objective depend on the team, so solve a copy and leave the template
+            # intact
+            team_model = model.clone()
+            unoptimised_model = self.changed(unoptimised_model, changes)
+            self.add_conditions(team_model, conditions)
+            team_index = self.team_database.get_team_index(team)
+            at_least_as_high = self.add_outside_top_n(team_model, unoptimised_model, team_index, top_n)
+            team_model.Maximize(unoptimised_model.total_points[team_index])
+            if cutoff is not None:
+                # Only scenarios that beat the best threshold so far matter, so proving there are none is enough
+                team_model.Add(unoptimised_model.total_points[team_index] > cutoff)
+
+            if hint is not None:
+                self.add_hint(team_model, len(model.proto.variables), unoptimised_model, team_index,
+                              at_least_as_high, hint)
+                solver.parameters.repair_hint = True
+        if self.rank_encoding == RankEncoding.COUNTING:
+            # The enforced comparisons only make it into the LP relaxation at level 2, and without them
+            # proving optimality for the top teams takes far longer than with the big-M matrix
+            solver.parameters.linearization_level = 2
+        status = profiler.solve(solver, team_model, team=team.name, cutoff=cutoff)
+        if status == cp_model.INFEASIBLE and cutoff is not None:
+            print(f"No solution above {cutoff} found while finishing outside of top {top_n}.")
+        elif status != cp_model.OPTIMAL:
             print(f"No optimal solution found, probably unable to finish outside of top {top_n}.")
 
         return [solver, status]
+
+    def changed(self, unoptimised_model: UnoptimisedModel, changes: [int] = None) -> UnoptimisedModel:
+        # Points changes per team on top of a built model, as a what-if transfer window would make
+        if changes is None or all(change == 0 for change in changes):
+            return unoptimised_model
+        if self.rank_encoding == RankEncoding.BIG_M:
+            # The big-M ranks are built into the template from the unchanged totals
+            raise ValueError("Points changes on top of a built model need the counting rank encoding")
+        return UnoptimisedModel(events=unoptimised_model.events,
+                                total_points=[total_points + change for total_points, change in
+                                              zip(unoptimised_model.total_points, changes)],
+                                total_domains=[total_domain.addition_with(cp_model.Domain(change, change))
+                                               for total_domain, change in
+                                               zip(unoptimised_model.total_domains, changes)],
+                                ranks=None)
+
+    @staticmethod
+    def add_conditions(model: CpModel, conditions: [[int]] = None):
+        # Each condition is a set of placement indicators (proto indices), one of which must be set. It is enforced by
+        # a literal of its own that is assumed rather than fixed, so an infeasible solve can say which conditions
+        # were to blame
+        for k, indicator_indices in enumerate([] if conditions is None else conditions):
+            holds = model.NewBoolVar(f'condition_{k}')
+            model.AddBoolOr([model.get_bool_var_from_proto_index(index)
+                             for index in indicator_indices]).only_enforce_if(holds)
+            model.AddAssumption(holds)
+
+    def conflicting_conditions(self, model: CpModel, conditions: [[int]],
+                               solver_config: SolverConfig = None) -> [int]:
+        # Indices of conditions that cannot all hold together, or none if they can
+        condition_model = model.clone()
+        first_condition_index = len(condition_model.proto.variables)
+        self.add_conditions(condition_model, conditions)
+        solver = cp_model.CpSolver()
+        (SolverConfig() if solver_config is None else solver_config).apply(solver)
+        if solver.Solve(condition_model) != cp_model.INFEASIBLE:
+            return []
+        return sorted(literal - first_condition_index for literal in solver.sufficient_assumptions_for_infeasibility())
+
+    def check_for(self, team: Team, unoptimised_model: UnoptimisedModel, model: CpModel, top_n, inside: bool,
+                  solver_config: SolverConfig = None, profiler: Profiler = None):
+        # Whether the team can finish inside (or outside) the top N at all. There is no objective, so CP-SAT stops at
+        # the first scenario it finds rather than proving one optimal
+        profiler = Profiler() if profiler is None else profiler
+        solver = cp_model.CpSolver()
+        (SolverConfig() if solver_config is None else solver_config).apply(solver)
+        with profiler.phase("build_team_model", team=team.name, inside=inside):
+            team_model = model.clone()
+            team_index = self.team_database.get_team_index(team)
+            if inside:
+                self.add_inside_top_n(team_model, unoptimised_model, team_index, top_n)
+            else:
+                self.add_outside_top_n(team_model, unoptimised_model, team_index, top_n)
+        status = profiler.solve(solver, team_model, team=team.name, inside=inside)
+        if status not in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+            return [status, []]
+        return [status, list(solver.response_proto.solution)]
+
+    def optimise_threshold(self, unoptimised_model: UnoptimisedModel, model: CpModel, top_n,
+                           solver_config: SolverConfig = None, upper_bound: int = None, profiler: Profiler = None):
+        # One solve for the whole threshold: maximise the (top_n + 1)-th highest total, letting the solver pick
+        # which team is left out rather than trying every team in turn
+        profiler = Profiler() if profiler is None else profiler
+        threshold_model = model.clone()
+        total_points = unoptimised_model.total_points
+        team_count_range = range(len(total_points))
+        # The threshold is the total of whichever team is left out, so it can only take values some team can reach
+        threshold_domain = cp_model.Domain.from_values([])
+        for total_domain in unoptimised_model.total_domains:
+            threshold_domain = threshold_domain.union_with(total_domain)
+        if upper_bound is not None:
+            threshold_domain = threshold_domain.intersection_with(cp_model.Domain.lower_or_equal(upper_bound))
+        threshold = threshold_model.new_int_var_from_domain(threshold_domain, 'threshold')
+        eliminated: [BooleanVar] = [threshold_model.NewBoolVar(f'eliminated_{i}') for i in team_count_range]
+        at_least_threshold: [BooleanVar] = [threshold_model.NewBoolVar(f'at_least_threshold_{i}')
+                                            for i in team_count_range]
+        for i in team_count_range:
+            threshold_model.Add(total_points[i] == threshold).only_enforce_if(eliminated[i])
+            threshold_model.Add(total_points[i] >= threshold).only_enforce_if(at_least_threshold[i])
+            threshold_model.AddImplication(eliminated[i], at_least_threshold[i])
+        threshold_model.AddExactlyOne(eliminated)
+        # The eliminated team plus at least top_n others level with or ahead of it
+        threshold_model.Add(sum(at_least_threshold) >= top_n + 1)
+        threshold_model.Maximize(threshold)
+
+        solver = cp_model.CpSolver()
+        (SolverConfig() if solver_config is None else solver_config).apply(solver)
+        solver.parameters.linearization_level = 2
+        status = profiler.solve(solver, threshold_model, team=None)
+        if status != cp_model.OPTIMAL:
+            print(f"No optimal solution found, probably unable for any team to finish outside of top {top_n}.")
+            return [solver, status, None]
+
+        eliminated_team = None
+        for team in self.team_database.get_all_teams():
+            if solver.Value(eliminated[self.team_database.get_team_index(team)]):
+                eliminated_team = team
+        return [solver, status, eliminated_team]
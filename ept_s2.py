@@ -1,7 +1,10 @@
+import argparse
 from collections import Counter
 from enum import Enum
 from ortools.sat.python import cp_model
 
+from solver_config import SolverConfig
+
 class SolvedModel:
     def __init__(self, model, teamlist,
                  r_s21, r_kl, r_s22, r_birmingham, r_s23,
@@ -519,7 +522,7 @@ class Model:
 
         return [model, x_birmingham, x_s23, d_birmingham, d_s23, d, aux, ranks]
 
-    def optimise(self, team_to_optimise, show_all, maxobjectivevalue):
+    def optimise(self, team_to_optimise, show_all, maxobjectivevalue, solver_config: SolverConfig = None):
         teamlist = self.teamlist
 
         [model, _, _, d_birmingham, d_s23, d, _, ranks] = self.build()
@@ -551,6 +554,7 @@ class Model:
                 return self.tounsolvedmodel(team_to_optimise)
 
         solver = cp_model.CpSolver()
+        (SolverConfig() if solver_config is None else solver_config).apply(solver)
         status = solver.Solve(model)
         if status == cp_model.OPTIMAL:
             objectivevalue = solver.ObjectiveValue()
@@ -572,16 +576,21 @@ class Model:
         return self.tosolvedmodel(team_to_optimise, None, None, None, None, -1)
 
 
-def main():
+def main(solver_config: SolverConfig = None):
     # Final constraint
     max_team = -1
     max_solution = -1
     max_model = None
+    solver_config = SolverConfig() if solver_config is None else solver_config
+    solver_config.start()
     # for t in [Model().teamlist.index('PSG Quest')]:
     for t in range(len(Model().currentpoints)):
         model = Model()
+        if solver_config.out_of_time():
+            print(f"Skipping {list(model.currentpoints.keys())[t]} as the global time limit has been reached")
+            continue
         print(f"Optimising for {list(model.currentpoints.keys())[t]}")
-        ninth = model.optimise(t, False, max_solution)
+        ninth = model.optimise(t, False, max_solution, solver_config)
         if ninth.maxpoints > 0:
             old_max_solution = max_solution
             if old_max_solution < ninth.maxpoints:
@@ -590,10 +599,17 @@ def main():
                 max_model = ninth
         print()
 
-    max_model.printsolution()
+    if max_model is None:
+        print("No scenario found before the global time limit was reached")
+    else:
+        max_model.printsolution()
 
     print("Done")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser()
+    SolverConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    main(solver_config=SolverConfig.from_args(args))
@@ -1,17 +1,24 @@
+import argparse
+
 import pyperclip
-from ortools.sat.python import cp_model
-from ortools.sat.python.cp_model import CpModel
 
+from clinch_search import ClinchSearch
 from display import Display
 from ept import EPT
 from ept_s3_tournaments.dreamleague_season_24 import DreamLeagueSeason24
 from ept_s3_tournaments.esl_one_bangkok_2024 import ESLOneBangkok2024
+from profiler import Profiler
+from rank_encoding import RankEncoding
+from result_cache import ResultCache, DEFAULT_CACHE_PATH
+from result_stream import ResultStream
+from solver_config import SolverConfig
 from teams import Team, TeamDatabase
+from threshold_search import ThresholdSearch
 from tournament import SolvedTournament
 from transfer_window import TransferWindow
 
 
-def main():
+def build_season(rank_encoding: RankEncoding = RankEncoding.BIG_M) -> EPT:
     teams: [Team] = [
         Team("Team Liquid"),
         Team("Gaimin Gladiators"),
@@ -49,7 +56,8 @@ def main():
 
     dreamleague_season_24: SolvedTournament = DreamLeagueSeason24().build(team_database)
 
-    between_dreamleague_season_24_esl_one_bangkok = TransferWindow(team_database=team_database)
+    between_dreamleague_season_24_esl_one_bangkok = TransferWindow(
+        team_database=team_database, title="Point changes between DreamLeague Season 24 and ESL One Bangkok")
     between_dreamleague_season_24_esl_one_bangkok.add_change("Nouns Esports", -30)
     between_dreamleague_season_24_esl_one_bangkok.add_change("Atlantic City", 30)
     between_dreamleague_season_24_esl_one_bangkok.add_change("Azure Ray", -125)
@@ -57,52 +65,107 @@ def main():
 
     esl_one_bangkok_2024: SolvedTournament = ESLOneBangkok2024().build(team_database)
 
-    ept: EPT = EPT(
-        dreamleague_season_24=dreamleague_season_24,
-        between_dreamleague_season_24_esl_one_bangkok=between_dreamleague_season_24_esl_one_bangkok,
-        esl_one_bangkok_2024=esl_one_bangkok_2024,
-        team_database=team_database
+    return EPT(
+        events=[dreamleague_season_24, between_dreamleague_season_24_esl_one_bangkok, esl_one_bangkok_2024],
+        team_database=team_database,
+        rank_encoding=rank_encoding
     )
 
-    max_objective_value = -1
-    max_solver = None
-    max_team = None
-    top_n = 4
-    for team in team_database.get_all_teams():
-        print(f"Now optimising for {team.name}")
-        model = CpModel()
-        unoptimised_model = ept.add_constraints(model)
-
-        # Optimise
-        [solver, status] = ept.optimise_for(team=team,
-                                            unoptimised_model=unoptimised_model,
-                                            model=model,
-                                            top_n=top_n)
-
-        if status != cp_model.OPTIMAL:
-            print(f"Team {team.name} probably cannot finish in top {top_n}")
-            continue
 
-        if solver.objective_value > max_objective_value:
-            max_objective_value = solver.objective_value
-            max_solver = solver
-            max_team = team
+def main(workers: int = 1, rank_encoding: RankEncoding = RankEncoding.BIG_M, single_solve: bool = False,
+         solver_config: SolverConfig = None, warm_start: bool = False, incumbent_cutoff: bool = False,
+         result_cache: ResultCache = None, profiler: Profiler = None, top_ns: [int] = None, exact: bool = True,
+         clinch: bool = False, result_stream: ResultStream = None):
+    ept: EPT = build_season(rank_encoding)
+    team_database = ept.team_database
+
+    top_ns = [4] if top_ns is None else top_ns
+    if clinch:
+        clinch_search = ClinchSearch(ept=ept, workers=workers, solver_config=solver_config, profiler=profiler)
+        output = ClinchSearch.table(clinch_search.run(team_database.get_all_teams(), top_ns))
+        print("Printing clinch and elimination table")
+        print(output)
+        return
+
+    threshold_search = ThresholdSearch(ept=ept, top_n=top_ns[0], workers=workers, solver_config=solver_config,
+                                       warm_start=warm_start, incumbent_cutoff=incumbent_cutoff,
+                                       result_cache=result_cache, profiler=profiler, exact=exact,
+                                       result_stream=result_stream)
+    results_by_top_n = threshold_search.sweep(team_database.get_all_teams(), top_ns, single_solve)
 
     display = Display()
-    output = display.print(team_to_optimise=max_team,
-                           max_points=max_objective_value,
-                           top_n=top_n,
-                           unoptimised_model=unoptimised_model,
-                           solver=max_solver,
-                           dreamleague_season_24=dreamleague_season_24,
-                           between_dreamleague_season_24_esl_one_bangkok=between_dreamleague_season_24_esl_one_bangkok,
-                           esl_one_bangkok_2024=esl_one_bangkok_2024,
-                           team_database=team_database)
-    print("Printing Liquipedia table")
-    print(output)
-    pyperclip.copy(output)
-
-
-print("Executing solver")
-main()
-print("Execution complete")
+    outputs: [str] = []
+    for top_n, results in results_by_top_n.items():
+        max_result = threshold_search.best(results)
+        if max_result is None:
+            print(f"No team was found that can finish outside of top {top_n}")
+            continue
+        max_team = team_database.get_team_by_name(max_result.team_name)
+
+        with threshold_search.profiler.phase("display", top_n=top_n):
+            output = display.print(team_to_optimise=max_team,
+                                   max_points=max_result.objective_value,
+                                   top_n=top_n,
+                                   snapshot=max_result.snapshot,
+                                   events=ept.events)
+        print(f"Printing Liquipedia table for top {top_n}")
+        print(output)
+        outputs.append(output)
+
+    if len(outputs) > 0:
+        pyperclip.copy("\n\n".join(outputs))
+
+
+def parse_top_ns(values: [str]) -> [int]:
+    # e.g. ["4", "8", "12"], or ["4-12:4"] for every fourth cutoff from 4 to 12 inclusive
+    top_ns: [int] = []
+    for value in values:
+        [cutoffs, _, step] = value.partition(":")
+        [start, _, end] = cutoffs.partition("-")
+        top_ns.extend(range(int(start), int(end or start) + 1, int(step or 1)))
+    if len(top_ns) == 0 or min(top_ns) < 1:
+        raise ValueError(f"Top N cutoffs must be at least 1, not {values}")
+    return sorted(set(top_ns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to solve teams with")
+    parser.add_argument("--rank-encoding", type=RankEncoding, choices=list(RankEncoding), default=RankEncoding.BIG_M,
+                        help="How finishing outside the top N is modelled")
+    parser.add_argument("--single-solve", action="store_true",
+                        help="Find the threshold in one solve instead of one solve per team")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="Hint each team's solve with its scenario from the previous cutoff, or else the "
+                             "previous solve")
+    parser.add_argument("--incumbent-cutoff", action="store_true",
+                        help="Only look for scenarios that beat the best threshold found so far")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_CACHE_PATH,
+                        help=f"Reuse per-team results from this SQLite file (default {DEFAULT_CACHE_PATH})")
+    parser.add_argument("--profile", help="Append per-phase timings and CP-SAT statistics to this JSON lines file")
+    parser.add_argument("--top-n", nargs="+", default=["4"],
+                        help="Cutoffs to find the threshold for, e.g. 4 8 12 or 4-12:4, all in one run")
+    parser.add_argument("--no-exact", action="store_true",
+                        help="Use CP-SAT even when only one tournament is still open")
+    parser.add_argument("--clinch", action="store_true",
+                        help="Only check which teams have clinched or been eliminated from each top N")
+    parser.add_argument("--stream",
+                        help="Append one JSON line per team to this file (- for stdout) as soon as its result is in")
+    parser.add_argument("--cprofile", help="Write cProfile stats of the main process to this file")
+    SolverConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    print("Executing solver")
+    profiler = Profiler(path=args.profile, cprofile_path=args.cprofile)
+    with profiler.profile():
+        main(workers=args.workers, rank_encoding=args.rank_encoding, single_solve=args.single_solve,
+             solver_config=SolverConfig.from_args(args), warm_start=args.warm_start,
+             incumbent_cutoff=args.incumbent_cutoff,
+             result_cache=None if args.cache is None else ResultCache(args.cache),
+             profiler=profiler,
+             top_ns=parse_top_ns(args.top_n),
+             exact=not args.no_exact,
+             clinch=args.clinch,
+             result_stream=ResultStream(args.stream))
+    print("Execution complete")
+
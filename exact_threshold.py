@@ -0,0 +1,356 @@
+import copy
+
+from ept import EPT
+from placement_bucket import PlacementBucket
+from teams import Team
+from tournament import SolvedTournament
+from transfer_window import TransferWindow
+
+# Resources that may be left partly unused at the end, unlike placement slots and qualifier spots
+OPTIONAL_RESOURCES = ["grand_final"]
+# States one programme may go through before CP-SAT is likely to be quicker. The real season needs under 1000, while
+# a 16 team event with two group stages and nothing but the groups known soon goes past 15000
+MAX_STATES = 5000
+
+
+class TooManyStates(Exception):
+    pass
+
+
+class TournamentPath:
+    # One way a team can go through a tournament: a bucket in each stage it plays, or none at all if it does not
+    # qualify, and the slots that takes up
+    def __init__(self, points: int, final_bucket: int = None, gs1_bucket: int = None, gs2_bucket: int = None,
+                 resources: [int] = None, gs1_resource: int = None):
+        self.points = points
+        self.final_bucket = final_bucket
+        self.gs1_bucket = gs1_bucket
+        self.gs2_bucket = gs2_bucket
+        self.resources = [] if resources is None else resources
+        self.gs1_resource = gs1_resource
+
+
+class TournamentPaths:
+    # Every outcome SolvedTournament.add_constraints allows, as a choice of one path per team such that each
+    # placement bucket, group slot and qualifier spot is used exactly as many times as it has room for
+    def __init__(self, tournament: SolvedTournament):
+        self.tournament = tournament
+        self.team_database = tournament.team_database
+        self.final_buckets, self.gs1_buckets, self.gs2_buckets = tournament.placement_buckets()
+        self.resource_indices: dict[tuple, int] = {}
+        self.capacities: [int] = []
+        self.paths: [[TournamentPath]] = [self.team_paths(team) for team in self.team_database.get_all_teams()]
+        self.required: [int] = [index for key, index in self.resource_indices.items()
+                                if key[0] not in OPTIONAL_RESOURCES]
+
+    def resource(self, key: tuple, capacity: int) -> int:
+        if key not in self.resource_indices:
+            self.resource_indices[key] = len(self.capacities)
+            self.capacities.append(capacity)
+        return self.resource_indices[key]
+
+    def team_paths(self, team: Team) -> [TournamentPath]:
+        tournament = self.tournament
+        if not tournament.can_participate(team):
+            return [TournamentPath(points=0)]
+
+        groups_known = tournament.gs1_a_teams is not None and tournament.gs1_b_teams is not None
+        entry: [int] = []
+        paths: [TournamentPath] = []
+        for region, regional_qualifier in tournament.qualifiers.items():
+            if team in regional_qualifier.teams and team not in tournament.invited_teams:
+                entry = [self.resource(("region", region), regional_qualifier.num_qualified)]
+                # Group teams have already qualified
+                if not groups_known or (team not in tournament.gs1_a_teams and team not in tournament.gs1_b_teams):
+                    paths.append(TournamentPath(points=0))
+
+        if groups_known:
+            if team in tournament.gs1_a_teams:
+                group = "A"
+            elif team in tournament.gs1_b_teams:
+                group = "B"
+            else:
+                return paths
+        else:
+            group = None
+
+        gs1_points_extended = tournament.gs1_points_extended()
+        for b in self.allowed(self.gs1_buckets, tournament.team_gs1_constraints, team):
+            gs1_bucket = self.gs1_buckets[b]
+            gs1_resource = self.resource(("gs1", group, b), self.gs1_capacity(gs1_bucket, group))
+            if self.capacities[gs1_resource] == 0:
+                continue
+            gs1_points = gs1_points_extended[gs1_bucket.best]
+            for gs2_bucket, stage_points, stage_resources in self.after_gs1(team, gs1_bucket):
+                for f in self.final_buckets_after(team, gs1_bucket, gs2_bucket):
+                    resources = entry + [gs1_resource] + stage_resources + \
+                        [self.resource(("final", f), self.final_buckets[f].size())]
+                    if team in tournament.team_guaranteed_playoff_lb_or_eliminated and self.final_buckets[f].worst <= 1:
+                        resources.append(self.resource(("grand_final",), 1))
+                    paths.append(TournamentPath(points=self.final_buckets[f].points + gs1_points + stage_points,
+                                                final_bucket=f,
+                                                gs1_bucket=b,
+                                                gs2_bucket=None if gs2_bucket is None else
+                                                self.gs2_buckets.index(gs2_bucket),
+                                                resources=resources,
+                                                gs1_resource=gs1_resource))
+        return paths
+
+    def after_gs1(self, team: Team, gs1_bucket: PlacementBucket) -> [(PlacementBucket | None, int, [int])]:
+        # The GS2 bucket (if any) a team can go on to, with the points and slots it brings
+        tournament = self.tournament
+        if tournament.gs2_team_count is None or gs1_bucket.best >= tournament.gs1_team_count:
+            return [(None, 0, [])]
+        if tournament.gs2_teams is not None and team not in tournament.gs2_teams:
+            return []
+
+        gs2_points_extended = tournament.gs2_points_extended()
+        return [(self.gs2_buckets[b], gs2_points_extended[self.gs2_buckets[b].best],
+                 [self.resource(("gs2", b), self.gs2_buckets[b].size())])
+                for b in self.allowed(self.gs2_buckets, tournament.team_gs2_constraints, team)
+                if self.gs2_buckets[b].worst < tournament.gs2_team_count]
+
+    def final_buckets_after(self, team: Team, gs1_bucket: PlacementBucket, gs2_bucket: PlacementBucket | None) -> [int]:
+        # Bottom GS1 = final result, and likewise bottom GS2; the rest play off for the places above
+        tournament = self.tournament
+        allowed = self.allowed(self.final_buckets, tournament.team_constraints, team)
+        if gs1_bucket.best >= tournament.gs1_team_count:
+            top_count = None
+            best = gs1_bucket.best
+        elif gs2_bucket is None:
+            top_count = tournament.gs1_team_count
+            best = None
+        elif gs2_bucket.best >= tournament.playoff_team_count:
+            top_count = None
+            best = gs2_bucket.best
+        else:
+            top_count = tournament.playoff_team_count
+            best = None
+
+        if top_count is None:
+            return [f for f in allowed if self.final_buckets[f].best == best]
+        return [f for f in allowed if self.final_buckets[f].worst < top_count]
+
+    def gs1_capacity(self, gs1_bucket: PlacementBucket, group: str | None) -> int:
+        # A finishes 1st, 3rd, 5th, etc. and B 2nd, 4th, 6th, etc.
+        if group is None:
+            return gs1_bucket.size()
+        first = gs1_bucket.best + (gs1_bucket.best % 2 if group == "A" else 1 - gs1_bucket.best % 2)
+        return len(range(first, min(gs1_bucket.worst + 1, self.tournament.gs1_team_count * 2), 2))
+
+    def allowed(self, buckets: [PlacementBucket], constraints, team: Team) -> [int]:
+        for team_constraint in constraints:
+            if team_constraint.team == team:
+                return SolvedTournament.buckets_between(buckets, team_constraint.best, team_constraint.worst)
+        return list(range(len(buckets)))
+
+    def resolved(self) -> bool:
+        # Every team scores the same whichever way the tournament went
+        return all(len({path.points for path in team_paths}) <= 1 for team_paths in self.paths)
+
+
+class ExactOutcome:
+    def __init__(self, team_name: str, total_points: int, paths: [[TournamentPath]]):
+        self.team_name = team_name
+        self.total_points = total_points
+        # The path every team took through every tournament, in EPT.tournaments() order
+        self.paths = paths
+
+
+class ExactThreshold:
+    # Once at most one tournament is still open, every other total is fixed and the threshold is a single
+    # assignment of that tournament's paths to teams. For each team and each score it could make there (best
+    # first), a dynamic programme over the teams, keyed by the slots still free, finds the most other teams that
+    # can finish level with or ahead of it. The first score where that reaches top_n is the team's optimum
+    def __init__(self, ept: EPT, max_states: int = MAX_STATES):
+        self.ept = ept
+        self.max_states = max_states
+        self.team_count = len(ept.team_database.get_all_teams())
+        self.tournament_paths = [TournamentPaths(tournament) for tournament in ept.tournaments()]
+        self.open = [t for t, tournament_paths in enumerate(self.tournament_paths) if not tournament_paths.resolved()]
+        self.fixed_points: [int] = [0] * self.team_count
+        for event in ept.events:
+            if isinstance(event, TransferWindow):
+                for i, change in enumerate(event.as_table()):
+                    self.fixed_points[i] += change
+        for t, tournament_paths in enumerate(self.tournament_paths):
+            if t not in self.open:
+                for i, team_paths in enumerate(tournament_paths.paths):
+                    self.fixed_points[i] += team_paths[0].points if len(team_paths) > 0 else 0
+        # Any one consistent outcome of each resolved tournament, for display
+        self.resolved_paths: dict[int, [TournamentPath]] = {}
+        for t, tournament_paths in enumerate(self.tournament_paths):
+            if t not in self.open:
+                self.resolved_paths[t] = self.assign(tournament_paths, [0] * self.team_count)
+
+    def applicable(self) -> bool:
+        return len(self.open) <= 1 and all(paths is not None for paths in self.resolved_paths.values())
+
+    def consistent(self) -> bool:
+        # Every tournament has some outcome that fills every slot, as it always does unless restricted
+        if any(paths is None for paths in self.resolved_paths.values()):
+            return False
+        open_paths = self.open_paths()
+        return open_paths is None or self.assign(open_paths, [0] * self.team_count) is not None
+
+    def restricted(self, team_paths: dict[(int, int), [TournamentPath]], changes: [int]) -> 'ExactThreshold':
+        # A copy with the paths of some (tournament, team) pairs narrowed down and a points change per team on top,
+        # sharing everything else, so the season's paths only ever need enumerating once
+        restricted = copy.copy(self)
+        restricted.tournament_paths = list(self.tournament_paths)
+        for (t, i), paths in team_paths.items():
+            if restricted.tournament_paths[t] is self.tournament_paths[t]:
+                restricted.tournament_paths[t] = copy.copy(self.tournament_paths[t])
+                restricted.tournament_paths[t].paths = list(self.tournament_paths[t].paths)
+            restricted.tournament_paths[t].paths[i] = paths
+        restricted.fixed_points = [fixed_points + change for fixed_points, change in zip(self.fixed_points, changes)]
+        # A restricted resolved tournament still scores the same, but may no longer have an outcome at all
+        restricted.resolved_paths = dict(self.resolved_paths)
+        for t in {t for t, _ in team_paths if t in self.resolved_paths}:
+            restricted.resolved_paths[t] = restricted.assign(restricted.tournament_paths[t], [0] * self.team_count)
+        return restricted
+
+    def open_paths(self) -> TournamentPaths | None:
+        return self.tournament_paths[self.open[0]] if len(self.open) > 0 else None
+
+    def bound(self, team: Team) -> int:
+        i = self.ept.team_database.get_team_index(team)
+        open_paths = self.open_paths()
+        if open_paths is None:
+            return self.fixed_points[i]
+        return self.fixed_points[i] + max((path.points for path in open_paths.paths[i]), default=0)
+
+    def optimise_for(self, team: Team, top_n: int, cutoff: int = None) -> ExactOutcome | None:
+        # None if the team cannot finish outside the top N, or not with more than cutoff points
+        i = self.ept.team_database.get_team_index(team)
+        open_paths = self.open_paths()
+        if open_paths is None:
+            values = [0]
+        else:
+            values = sorted({path.points for path in open_paths.paths[i]}, reverse=True)
+
+        for value in values:
+            total_points = self.fixed_points[i] + value
+            if cutoff is not None and total_points <= cutoff:
+                break
+            # Ties count against a team, as in EPT.add_rank_constraints
+            needs = [total_points - fixed_points for fixed_points in self.fixed_points]
+            if open_paths is None:
+                if sum(1 for j in range(self.team_count) if j != i and needs[j] <= 0) >= top_n:
+                    return self.outcome(team, total_points, None)
+                continue
+
+            paths = self.assign(open_paths, needs, i, value, top_n)
+            if paths is not None:
+                return self.outcome(team, total_points, paths)
+        return None
+
+    def outcome(self, team: Team, total_points: int, open_paths: [TournamentPath] = None) -> ExactOutcome:
+        paths = [self.resolved_paths.get(t, open_paths) for t in range(len(self.tournament_paths))]
+        return ExactOutcome(team_name=team.name, total_points=total_points, paths=paths)
+
+    def assign(self, tournament_paths: TournamentPaths, needs: [int], team_index: int = None, value: int = None,
+               top_n: int = 0) -> [TournamentPath]:
+        # Paths for every team with at least top_n teams other than team_index meeting their need, and team_index
+        # scoring exactly value, or None if there is no such outcome
+        choices: [[TournamentPath]] = []
+        for i, team_paths in enumerate(tournament_paths.paths):
+            if i == team_index:
+                team_paths = [path for path in team_paths if path.points == value]
+            # Of the paths taking up the same slots only the highest scoring one matters
+            by_resources: dict[tuple, TournamentPath] = {}
+            for path in team_paths:
+                key = tuple(path.resources)
+                if key not in by_resources or path.points > by_resources[key].points:
+                    by_resources[key] = path
+            choices.append(list(by_resources.values()))
+
+        def satisfied(i: int, path: TournamentPath) -> int:
+            return 1 if i != team_index and path.points >= needs[i] else 0
+
+        # Teams outside the tournament take up no slots, so only the others need placing
+        placed = [i for i in range(len(choices)) if any(len(path.resources) > 0 for path in choices[i])]
+        # Teams competing for the same slots go next to each other, so those slots are used up, and the states that
+        # differ only in how they were used up merge, as early as possible
+        placed.sort(key=lambda i: sorted({path.gs1_resource for path in choices[i] if path.gs1_resource is not None}))
+        target = max(0, top_n - sum(satisfied(i, choices[i][0]) for i in range(len(choices)) if i not in placed))
+        # Most teams from each position onwards that could meet their need at all, ignoring each other
+        reachable = [0] * (len(placed) + 1)
+        for k in reversed(range(len(placed))):
+            reachable[k] = reachable[k + 1] + max(satisfied(placed[k], path) for path in choices[placed[k]])
+        if reachable[0] < target:
+            return None
+
+        # The slots left are packed into one integer, a field per resource with a guard bit on top that a
+        # subtraction only clears if the field goes below zero, so taking a path is one subtraction and one mask
+        capacities = tournament_paths.capacities
+        # Wide enough for the number of teams that could fill a slot, as well as the slot's capacity
+        width = max(capacities + [len(placed), 1]).bit_length() + 1
+        guards = sum(1 << (r * width + width - 1) for r in range(len(capacities)))
+        required_guards = sum(1 << (r * width + width - 1) for r in tournament_paths.required)
+
+        def pack(counts: [int]) -> int:
+            return sum(count << (r * width) for r, count in enumerate(counts))
+
+        def delta(path: TournamentPath) -> int:
+            return sum(1 << (r * width) for r in path.resources)
+
+        options: [[(int, int, TournamentPath)]] = [[(delta(path), satisfied(i, path), path) for path in choices[i]]
+                                                   for i in placed]
+        # How many of the teams from each position onwards could take up each slot, to drop dead ends early
+        fillable: [int] = [guards] * (len(placed) + 1)
+        counts = [0] * len(capacities)
+        for k in reversed(range(len(placed))):
+            for resource in {resource for path in choices[placed[k]] for resource in path.resources}:
+                counts[resource] += 1
+            fillable[k] = pack(counts) | guards
+
+        memo: dict[tuple, int] = {}
+
+        def most_satisfied(k: int, slots: int) -> int:
+            # Most teams from placed[k] onwards that can meet their need with the slots left, capped at target as
+            # nothing more is needed, or -1 if they cannot fill every slot between them
+            if (fillable[k] - (slots & ~guards)) & required_guards != required_guards:
+                return -1
+            if k == len(placed):
+                return 0
+            key = (k, slots)
+            if key in memo:
+                return memo[key]
+
+            best = -1
+            enough = min(target, reachable[k])
+            for path_delta, path_satisfied, _ in options[k]:
+                remaining = slots - path_delta
+                if remaining & guards != guards:
+                    continue
+                rest = most_satisfied(k + 1, remaining)
+                if rest >= 0:
+                    best = max(best, min(target, rest + path_satisfied))
+                    if best >= enough:
+                        break
+            memo[key] = best
+            if len(memo) > self.max_states:
+                raise TooManyStates(f"More than {self.max_states} states in {tournament_paths.tournament.name}")
+            return best
+
+        slots = pack(capacities) | guards
+        if most_satisfied(0, slots) < target:
+            return None
+
+        # Walk back down the programme, taking a path that keeps enough teams meeting their need
+        paths: [TournamentPath] = [choices[i][0] for i in range(len(choices))]
+        needed = target
+        for k, i in enumerate(placed):
+            for path_delta, path_satisfied, path in options[k]:
+                remaining = slots - path_delta
+                if remaining & guards != guards:
+                    continue
+                rest = most_satisfied(k + 1, remaining)
+                if rest >= 0 and rest + path_satisfied >= needed:
+                    paths[i] = path
+                    needed = max(0, needed - path_satisfied)
+                    slots = remaining
+                    break
+        return paths
+
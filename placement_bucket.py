@@ -0,0 +1,9 @@
+class PlacementBucket:
+    # Consecutive placements (0-based, inclusive) worth the same points, modelled as one indicator column
+    def __init__(self, best: int, worst: int, points: int):
+        self.best = best
+        self.worst = worst
+        self.points = points
+
+    def size(self) -> int:
+        return self.worst - self.best + 1
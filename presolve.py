@@ -0,0 +1,103 @@
+from ortools.constraint_solver.pywrapcp import BooleanVar
+from ortools.sat.python import cp_model
+from ortools.sat.python.cp_model import CpModel
+
+# A placement indicator before it is a variable: (stage, team index, bucket), with stages as
+# UnoptimisedTournamentModel.stages() lists them
+Cell = (int, int, int)
+
+
+class CellConstraint:
+    # lower <= sum(coefficient * cell) <= upper
+    def __init__(self, terms: [(Cell, int)], lower: int, upper: int):
+        self.terms = terms
+        self.lower = lower
+        self.upper = upper
+
+
+class Presolve:
+    # The placement indicators of one tournament as plain Python values until the constraints between them have been
+    # propagated. Cells the constraints settle (pinned GS1 pairs, fixed GS2 places, fixed final placements, teams that
+    # cannot take part) become the ints 0 or 1, and only the cells left open become variables, with only the
+    # constraints still in doubt added to the model
+    def __init__(self, team_count: int, bucket_counts: [int]):
+        # None while open
+        self.values: [[[int | None]]] = [[[None] * bucket_count for _ in range(team_count)]
+                                         for bucket_count in bucket_counts]
+        self.constraints: [CellConstraint] = []
+        # Set if the constraints contradict each other, in which case the solver is left to say so
+        self.infeasible = False
+
+    def fix_row(self, stage: int, team_index: int, value: int):
+        self.values[stage][team_index] = [value] * len(self.values[stage][team_index])
+
+    def add(self, terms: [(Cell, int)], lower: int, upper: int):
+        self.constraints.append(CellConstraint(terms, lower, upper))
+
+    def add_sum(self, cells: [Cell], lower: int, upper: int = None):
+        self.add([(cell, 1) for cell in cells], lower, lower if upper is None else upper)
+
+    def add_same(self, cells: [Cell], other_cells: [Cell]):
+        # As many of the first cells set as of the others
+        self.add([(cell, 1) for cell in cells] + [(cell, -1) for cell in other_cells], 0, 0)
+
+    def value(self, cell: Cell) -> int | None:
+        stage, team_index, b = cell
+        return self.values[stage][team_index][b]
+
+    def run(self):
+        changed = True
+        while changed and not self.infeasible:
+            changed = False
+            for constraint in self.constraints:
+                changed |= self.propagate(constraint)
+
+    def propagate(self, constraint: CellConstraint) -> bool:
+        fixed = 0
+        open_terms: [(Cell, int)] = []
+        for cell, coefficient in constraint.terms:
+            value = self.value(cell)
+            if value is None:
+                open_terms.append((cell, coefficient))
+            else:
+                fixed += coefficient * value
+        lowest = fixed + sum(min(0, coefficient) for _, coefficient in open_terms)
+        highest = fixed + sum(max(0, coefficient) for _, coefficient in open_terms)
+        if lowest > constraint.upper or highest < constraint.lower:
+            self.infeasible = True
+            return False
+
+        # A cell is settled if setting it the other way would leave the sum out of range whatever the rest do
+        changed = False
+        for (stage, team_index, b), coefficient in open_terms:
+            if highest - abs(coefficient) < constraint.lower:
+                self.values[stage][team_index][b] = 1 if coefficient > 0 else 0
+                changed = True
+            elif lowest + abs(coefficient) > constraint.upper:
+                self.values[stage][team_index][b] = 0 if coefficient > 0 else 1
+                changed = True
+        return changed
+
+    def indicators(self, model: CpModel, stage: int, name: str) -> [[BooleanVar | int]]:
+        return [[model.new_bool_var(f'{name}_{i}_{b}') if value is None else value for b, value in enumerate(row)]
+                for i, row in enumerate(self.values[stage])]
+
+    def add_to(self, model: CpModel, indicators: [[[BooleanVar | int]]]):
+        # Only constraints with an open cell left, as any others already hold (or the solver is handed the one that
+        # does not)
+        for constraint in self.constraints:
+            fixed = 0
+            variables: [BooleanVar] = []
+            coefficients: [int] = []
+            for (stage, team_index, b), coefficient in constraint.terms:
+                indicator = indicators[stage][team_index][b]
+                if isinstance(indicator, int):
+                    fixed += coefficient * indicator
+                else:
+                    variables.append(indicator)
+                    coefficients.append(coefficient)
+            if len(variables) > 0:
+                model.add_linear_constraint(cp_model.LinearExpr.weighted_sum(variables, coefficients),
+                                            constraint.lower - fixed, constraint.upper - fixed)
+            elif not constraint.lower <= fixed <= constraint.upper:
+                model.Add(False)
@@ -0,0 +1,103 @@
+import cProfile
+import json
+import math
+import os
+import re
+import time
+import uuid
+from contextlib import contextmanager
+
+from ortools.sat.python.cp_model import CpModel, CpSolver, CpSolverStatus
+
+# e.g. "#Bound   0.24s best:4480  next:[4540,5680] main" or "#3       0.24s best:5200  next:[] main"
+PROGRESS_LINE = re.compile(r"^#(\w+)\s+([\d.]+)s\s+best:(\S+)\s+next:\[([^]]*)]")
+
+
+class Profiler:
+    # Times each phase of a run and appends one JSON line per phase to path. Without a path it does nothing, so it
+    # can be passed around unconditionally. Pool processes get a copy and append to the same file
+    def __init__(self, path: str = None, cprofile_path: str = None):
+        self.path = path
+        self.cprofile_path = cprofile_path
+        self.run_id = uuid.uuid4().hex
+
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def record(self, phase: str, seconds: float, **fields):
+        if not self.enabled():
+            return
+
+        record = {"run": self.run_id, "pid": os.getpid(), "time": time.time(), "phase": phase, "seconds": seconds,
+                  **fields}
+        with open(self.path, "a") as profile_file:
+            profile_file.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def phase(self, phase: str, **fields):
+        start = time.perf_counter()
+        yield
+        self.record(phase, time.perf_counter() - start, **fields)
+
+    def solve(self, solver: CpSolver, model: CpModel, **fields) -> CpSolverStatus:
+        if not self.enabled():
+            return solver.Solve(model)
+
+        # The search log is the only place CP-SAT reports when presolve ended and how the bounds moved
+        log_lines: [str] = []
+        solver.parameters.log_search_progress = True
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = log_lines.append
+        start = time.perf_counter()
+        status = solver.Solve(model)
+        seconds = time.perf_counter() - start
+
+        # [seconds, best, lower end of next, upper end of next] for every new solution or bound
+        progression = []
+        for log_line in log_lines:
+            match = PROGRESS_LINE.match(log_line)
+            if match is not None:
+                next_range = match.group(4).split(",") if "," in match.group(4) else [None, None]
+                progression.append([float(match.group(2)), self.log_number(match.group(3))] +
+                                   [self.log_number(value) for value in next_range])
+        self.record("solve", seconds,
+                    status=status.name,
+                    objective=solver.objective_value if status in [CpSolverStatus.OPTIMAL,
+                                                                   CpSolverStatus.FEASIBLE] else None,
+                    best_bound=solver.best_objective_bound,
+                    conflicts=solver.num_conflicts,
+                    branches=solver.num_branches,
+                    wall_time=solver.wall_time,
+                    user_time=solver.user_time,
+                    deterministic_time=solver.response_proto.deterministic_time,
+                    # Presolve and loading the model are done by the first progress line
+                    presolve_seconds=progression[0][0] if len(progression) > 0 else None,
+                    bound_progression=progression,
+                    **fields)
+        return status
+
+    @staticmethod
+    def log_number(value: str | None) -> float | None:
+        # "-inf" and "inf" are not valid JSON numbers
+        if value is None:
+            return None
+        try:
+            number = float(value)
+        except ValueError:
+            return None
+        return number if math.isfinite(number) else None
+
+    @contextmanager
+    def profile(self):
+        # cProfile of this process only; pool processes are not captured
+        if self.cprofile_path is None:
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(self.cprofile_path)
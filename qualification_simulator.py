@@ -0,0 +1,261 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from ept import EPT
+from ept_s3 import build_season, parse_top_ns
+from tournament import SolvedTournament, TeamConstraint
+from transfer_window import TransferWindow
+
+# Two-sided 95% quantile of the standard normal, for the Wilson score intervals
+Z_95 = 1.959963984540054
+# Batches in a row that may come back short before a tournament is given up on as too constrained to sample
+MAX_SHORT_BATCHES = 100
+
+
+class QualificationProbability:
+    def __init__(self, team_name: str, probability: float, low: float, high: float):
+        self.team_name = team_name
+        self.probability = probability
+        # 95% confidence interval
+        self.low = low
+        self.high = high
+
+
+class QualificationSimulator:
+    # Estimates each team's chance of finishing in the top N by drawing whole seasons at random, a batch at a time.
+    # Each stage is a shuffle of the teams in it, with a constrained team's draw kept inside its known range. Draws
+    # that still break a constraint are thrown away, so every season kept is one the CP-SAT model would accept
+    def __init__(self, ept: EPT, seed: int = 0, batch_size: int = 100000):
+        self.ept = ept
+        self.team_database = ept.team_database
+        self.team_count = len(ept.team_database.get_all_teams())
+        self.rng = np.random.default_rng(seed)
+        self.batch_size = batch_size
+
+    def run(self, top_ns: [int], samples: int) -> dict[int, [QualificationProbability]]:
+        in_top_n: dict[int, np.ndarray] = {top_n: np.zeros(self.team_count, dtype=np.int64) for top_n in top_ns}
+        drawn = 0
+        while drawn < samples:
+            ranks = self.ranks(self.sample_totals(min(self.batch_size, samples - drawn)))
+            for top_n in top_ns:
+                in_top_n[top_n] += (ranks <= top_n).sum(axis=0)
+            drawn += len(ranks)
+
+        probabilities: dict[int, [QualificationProbability]] = {}
+        for top_n in top_ns:
+            probabilities[top_n] = []
+            for team, successes in zip(self.team_database.get_all_teams(), in_top_n[top_n]):
+                [low, high] = self.wilson_interval(int(successes), samples)
+                probabilities[top_n].append(QualificationProbability(team_name=team.name,
+                                                                     probability=successes / samples,
+                                                                     low=low,
+                                                                     high=high))
+        return probabilities
+
+    def sample_totals(self, sample_count: int) -> np.ndarray:
+        # Tournaments are independent of each other, so each is sampled (and rejected from) on its own
+        totals = np.zeros((sample_count, self.team_count), dtype=np.int64)
+        for event in self.ept.events:
+            if isinstance(event, SolvedTournament):
+                totals += self.sample_tournament(event, sample_count)
+            elif isinstance(event, TransferWindow):
+                totals += np.asarray(event.as_table(), dtype=np.int64)
+        return totals
+
+    def sample_tournament(self, tournament: SolvedTournament, sample_count: int) -> np.ndarray:
+        batches: [np.ndarray] = []
+        kept = 0
+        short_batches = 0
+        while kept < sample_count:
+            points = self.draw_tournament(tournament, sample_count)
+            batches.append(points)
+            kept += len(points)
+            short_batches = short_batches + 1 if len(points) < sample_count else 0
+            if short_batches >= MAX_SHORT_BATCHES and kept < sample_count:
+                raise ValueError(f"Too few draws of {tournament.name} satisfy its constraints to sample it")
+        return np.concatenate(batches)[:sample_count]
+
+    def draw_tournament(self, tournament: SolvedTournament, sample_count: int) -> np.ndarray:
+        # Placements are 0-based within each stage, and -1 for teams not in it
+        participants = self.draw_participants(tournament, sample_count)
+
+        # Later stages' results narrow down where a team finished earlier on
+        final_constraints = tournament.team_constraints
+        gs2_constraints = tournament.team_gs2_constraints
+        gs1_constraints = tournament.team_gs1_constraints + \
+            self.stage_constraints(final_constraints, tournament.gs1_team_count, tournament.team_count)
+        if tournament.gs2_team_count is not None:
+            gs1_constraints += self.stage_constraints(gs2_constraints, tournament.gs1_team_count,
+                                                      tournament.team_count)
+            gs2_constraints = gs2_constraints + self.stage_constraints(final_constraints,
+                                                                       tournament.playoff_team_count,
+                                                                       tournament.gs2_team_count)
+            if tournament.gs2_teams is not None:
+                gs1_constraints += [TeamConstraint(team=team, best=0, worst=tournament.gs1_team_count - 1)
+                                    for team in tournament.gs2_teams]
+
+        # A1 = 1st, B1 = 2nd, A2 = 3rd, etc.
+        if tournament.gs1_a_teams is not None and tournament.gs1_b_teams is not None:
+            gs1 = np.maximum(
+                self.draw(participants & self.team_mask(tournament.gs1_a_teams),
+                          range(0, tournament.gs1_team_count * 2, 2), gs1_constraints),
+                self.draw(participants & self.team_mask(tournament.gs1_b_teams),
+                          range(1, tournament.gs1_team_count * 2, 2), gs1_constraints))
+        else:
+            gs1 = self.draw(participants, range(tournament.team_count), gs1_constraints)
+        gs1_top = (gs1 >= 0) & (gs1 < tournament.gs1_team_count)
+
+        # Bottom GS1 = final result, and likewise bottom GS2
+        gs2 = None
+        if tournament.gs2_team_count is not None:
+            gs2 = self.draw(gs1_top, range(tournament.gs2_team_count), gs2_constraints)
+            playoffs = (gs2 >= 0) & (gs2 < tournament.playoff_team_count)
+            final = np.where(gs1_top, gs2, gs1)
+            final = np.where(playoffs, self.draw(playoffs, range(tournament.playoff_team_count), final_constraints),
+                             final)
+        else:
+            final = np.where(gs1_top, self.draw(gs1_top, range(tournament.gs1_team_count), final_constraints), gs1)
+
+        valid = self.satisfies(tournament, participants, gs1_top, final, gs1, gs2)
+        points = self.points_at(final, tournament.points) + self.points_at(gs1, tournament.gs1_points_extended())
+        if gs2 is not None:
+            points += self.points_at(gs2, tournament.gs2_points_extended())
+        return points[valid]
+
+    def draw_participants(self, tournament: SolvedTournament, sample_count: int) -> np.ndarray:
+        # Known groups already say who qualified
+        if tournament.gs1_a_teams is not None and tournament.gs1_b_teams is not None:
+            participants = self.team_mask(tournament.gs1_a_teams + tournament.gs1_b_teams)
+            return np.repeat(participants[np.newaxis, :], sample_count, axis=0)
+
+        participants = np.repeat(self.team_mask(tournament.invited_teams)[np.newaxis, :], sample_count, axis=0)
+        for regional_qualifier in tournament.qualifiers.values():
+            team_indices = np.asarray(self.team_indices(regional_qualifier.teams))
+            keys = self.rng.random((sample_count, len(team_indices)))
+            qualified = np.argsort(keys, axis=1)[:, :regional_qualifier.num_qualified]
+            participants[np.arange(sample_count)[:, np.newaxis], team_indices[qualified]] = True
+        return participants
+
+    def draw(self, participants: np.ndarray, slots: range, constraints: [TeamConstraint]) -> np.ndarray:
+        # Orders the participants of each sample by a random key and hands out the slots in that order. Only the
+        # teams that take part in some sample are drawn for, which is usually well under half the database
+        slots = np.asarray(slots)
+        columns = np.flatnonzero(participants.any(axis=0))
+        taking_part = participants[:, columns]
+        keys = self.rng.random(taking_part.shape) * len(slots)
+        # A team can have several constraints on one stage, e.g. its own and one implied by a later stage
+        ranges: dict[int, (int, int)] = {}
+        for team_constraint in constraints:
+            team_index = self.team_database.get_team_index(team_constraint.team)
+            [best, worst] = ranges.get(team_index, (0, len(slots) * 2))
+            ranges[team_index] = (max(best, team_constraint.best), min(worst, team_constraint.worst))
+        for column, team_index in enumerate(columns):
+            if team_index not in ranges:
+                continue
+            [best, worst] = ranges[team_index]
+            allowed = np.flatnonzero((slots >= best) & (slots <= worst))
+            if len(allowed) > 0:
+                keys[:, column] = allowed[0] + self.rng.random(len(keys)) * len(allowed)
+        keys[~taking_part] = np.inf
+
+        order = np.argsort(keys, axis=1)
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(len(columns))[np.newaxis, :], axis=1)
+        placements = np.full(participants.shape, -1, dtype=np.int64)
+        placements[:, columns] = np.where(taking_part, slots[np.minimum(ranks, len(slots) - 1)], -1)
+        return placements
+
+    def satisfies(self, tournament: SolvedTournament, participants: np.ndarray, gs1_top: np.ndarray,
+                  final: np.ndarray, gs1: np.ndarray, gs2: np.ndarray | None) -> np.ndarray:
+        # The same rules as SolvedTournament.add_constraints, checked on every sample at once
+        valid = participants[:, self.team_indices(tournament.invited_teams)].all(axis=1)
+        for regional_qualifier in tournament.qualifiers.values():
+            valid &= participants[:, self.team_indices(regional_qualifier.teams)].sum(axis=1) == \
+                regional_qualifier.num_qualified
+        for placements, constraints in [(final, tournament.team_constraints), (gs1, tournament.team_gs1_constraints),
+                                        (gs2, tournament.team_gs2_constraints)]:
+            for team_constraint in constraints:
+                team_placements = placements[:, self.team_database.get_team_index(team_constraint.team)]
+                valid &= (team_placements >= team_constraint.best) & (team_placements <= team_constraint.worst)
+        if tournament.gs2_teams is not None:
+            valid &= gs1_top[:, self.team_indices(tournament.gs2_teams)].all(axis=1)
+        if len(tournament.team_guaranteed_playoff_lb_or_eliminated) > 0:
+            grand_finalists = final[:, self.team_indices(tournament.team_guaranteed_playoff_lb_or_eliminated)]
+            valid &= ((grand_finalists >= 0) & (grand_finalists <= 1)).sum(axis=1) <= 1
+        return valid
+
+    def team_indices(self, teams) -> [int]:
+        return [self.team_database.get_team_index(team) for team in teams]
+
+    def team_mask(self, teams) -> np.ndarray:
+        mask = np.zeros(self.team_count, dtype=bool)
+        mask[self.team_indices(teams)] = True
+        return mask
+
+    @staticmethod
+    def stage_constraints(constraints: [TeamConstraint], top_count: int, stage_count: int) -> [TeamConstraint]:
+        # Later-stage constraints as seen from a stage that ranks stage_count teams and sends its top top_count on:
+        # placements below the top are decided in this stage, and anything in the top only needs the team to go through
+        stage_constraints: [TeamConstraint] = []
+        for team_constraint in constraints:
+            if top_count <= team_constraint.best and team_constraint.worst < stage_count:
+                stage_constraints.append(team_constraint)
+            elif team_constraint.worst < top_count:
+                stage_constraints.append(TeamConstraint(team=team_constraint.team, best=0, worst=top_count - 1))
+        return stage_constraints
+
+    @staticmethod
+    def points_at(placements: np.ndarray, point_table: [int]) -> np.ndarray:
+        return np.where(placements >= 0, np.asarray(point_table, dtype=np.int64)[placements], 0)
+
+    @staticmethod
+    def ranks(totals: np.ndarray) -> np.ndarray:
+        # Ties count against a team, as in EPT.add_rank_constraints: its rank is the number of teams level with or
+        # ahead of it
+        order = np.argsort(-totals, axis=1, kind="stable")
+        sorted_totals = np.take_along_axis(totals, order, axis=1)
+        positions = np.arange(totals.shape[1])
+        last_of_tie = np.ones(sorted_totals.shape, dtype=bool)
+        last_of_tie[:, :-1] = sorted_totals[:, :-1] != sorted_totals[:, 1:]
+        tie_ends = np.where(last_of_tie, positions, totals.shape[1])
+        sorted_ranks = np.minimum.accumulate(tie_ends[:, ::-1], axis=1)[:, ::-1] + 1
+        ranks = np.empty_like(sorted_ranks)
+        np.put_along_axis(ranks, order, sorted_ranks, axis=1)
+        return ranks
+
+    @staticmethod
+    def wilson_interval(successes: int, samples: int) -> (float, float):
+        # Stays inside [0, 1] and is still sensible for probabilities of 0 or 1, unlike the normal approximation
+        proportion = successes / samples
+        denominator = 1 + Z_95 ** 2 / samples
+        centre = (proportion + Z_95 ** 2 / (2 * samples)) / denominator
+        margin = Z_95 * math.sqrt(proportion * (1 - proportion) / samples + Z_95 ** 2 / (4 * samples ** 2)) / denominator
+        return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+def main(args: argparse.Namespace):
+    ept = build_season()
+    simulator = QualificationSimulator(ept=ept, seed=args.seed, batch_size=args.batch_size)
+    start = time.perf_counter()
+    probabilities_by_top_n = simulator.run(parse_top_ns(args.top_n), args.samples)
+    print(f"Simulated {args.samples} seasons in {time.perf_counter() - start:.2f}s")
+
+    for top_n, probabilities in probabilities_by_top_n.items():
+        print(f"Chance of finishing in the top {top_n}")
+        for probability in sorted(probabilities, key=lambda p: p.probability, reverse=True):
+            print(f"{probability.team_name:<20} {probability.probability:>8.2%} "
+                  f"({probability.low:.2%} - {probability.high:.2%})")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate each team's chance of finishing in the top N by simulation")
+    parser.add_argument("--samples", type=int, default=1000000, help="Number of seasons to simulate")
+    parser.add_argument("--top-n", nargs="+", default=["4"], help="Cutoffs, e.g. 4 8 12 or 4-12:4")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=100000, help="Seasons to simulate at once")
+
+    main(parser.parse_args())
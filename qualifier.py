@@ -8,6 +8,11 @@ class Qualifier:
         self.teams = teams
         self.num_qualified = num_qualified
 
+    def definition(self) -> dict:
+        return {"region": self.region.name,
+                "teams": [team.name for team in self.teams],
+                "num_qualified": self.num_qualified}
+
     def eliminate(self, team: Team):
         self.teams.pop(team)
 
@@ -0,0 +1,11 @@
+from enum import Enum
+
+
+class RankEncoding(Enum):
+    # Full n x n comparison matrix with big-M constraints, giving every team an explicit rank
+    BIG_M = "big_m"
+    # Only the target team: count how many other teams score at least as much, O(n) literals
+    COUNTING = "counting"
+
+    def __str__(self):
+        return self.value
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+from ortools.sat.python import cp_model
+from ortools.sat.python.cp_model import CpSolverStatus
+
+from ept import EPT
+from snapshot import Snapshot
+from team_result import TeamResult
+
+DEFAULT_CACHE_PATH = ".ept_cache/results.sqlite"
+
+
+class ResultCache:
+    # Per-team results keyed by a hash of everything that determines them, shared between runs and processes.
+    # SQLite does the locking, so several runs can read and write the same file at once
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = 10000):
+        self.path = path
+        self.max_entries = max_entries
+        if os.path.dirname(path) != "":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with closing(self.connect()) as connection, connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS results ("
+                               "key TEXT PRIMARY KEY, "
+                               "value TEXT NOT NULL, "
+                               "last_access REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(ept: EPT, top_n: int, team_name: str, conditions: [[int]] = None, changes: [int] = None) -> str:
+        definition = {"season": ept.definition(), "top_n": top_n, "team": team_name}
+        # What-if conditions (indicator indices, which the season's template fixes) and points changes make it a
+        # different question. Left out when unset, so plain runs keep their keys
+        if conditions:
+            definition["conditions"] = sorted(sorted(indicator_indices) for indicator_indices in conditions)
+        if changes is not None and any(change != 0 for change in changes):
+            definition["changes"] = changes
+        return hashlib.sha256(json.dumps(definition, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(self, key: str, variable_count: int) -> TeamResult | None:
+        with closing(self.connect()) as connection, connection:
+            row = connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+
+        value = json.loads(row[0])
+        # A solution is only meaningful against a template with the same variables, and entries from before snapshots
+        # cannot be displayed
+        if value["variable_count"] != variable_count or "snapshot" not in value:
+            return None
+        return TeamResult(team_name=value["team_name"],
+                          status=getattr(CpSolverStatus, value["status"]),
+                          objective_value=value["objective_value"],
+                          solution=value["solution"],
+                          snapshot=None if value["snapshot"] is None else Snapshot.from_dict(value["snapshot"]))
+
+    def put(self, key: str, result: TeamResult, variable_count: int):
+        # Only the team's true answer is worth keeping, not a time-limited or cutoff-pruned one
+        if result.skipped:
+            return
+        if result.status != cp_model.OPTIMAL and (result.status != cp_model.INFEASIBLE or result.cutoff is not None):
+            return
+
+        value = json.dumps({"team_name": result.team_name,
+                            "status": result.status.name,
+                            "objective_value": result.objective_value,
+                            "solution": result.solution,
+                            "snapshot": None if result.snapshot is None else result.snapshot.as_dict(),
+                            "variable_count": variable_count})
+        with closing(self.connect()) as connection, connection:
+            connection.execute("INSERT OR REPLACE INTO results (key, value, last_access) VALUES (?, ?, ?)",
+                               (key, value, time.time()))
+            # Evict the least recently used entries beyond the limit
+            connection.execute("DELETE FROM results WHERE key IN ("
+                               "SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                               (self.max_entries,))
@@ -0,0 +1,49 @@
+import json
+import time
+
+from ortools.sat.python import cp_model
+
+from team_result import TeamResult
+
+
+class ResultStream:
+    # Writes one JSON line per team as soon as its result is in, so a dashboard can follow a run rather than wait for
+    # the slowest team. "-" is stdout, between the progress messages. Without a path it does nothing, like Profiler
+    def __init__(self, path: str = None):
+        self.path = path
+
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def write(self, result: TeamResult, top_n: int):
+        if not self.enabled():
+            return
+
+        optimal = result.status == cp_model.OPTIMAL
+        record = {"time": time.time(),
+                  "top_n": top_n,
+                  "team": result.team_name,
+                  "status": result.status.name,
+                  "skipped": result.skipped,
+                  "objective": round(result.objective_value) if optimal else None,
+                  "bound": result.bound,
+                  "cutoff": result.cutoff,
+                  "seconds": result.seconds,
+                  "scenario": self.scenario(result) if optimal else None}
+        line = json.dumps(record)
+        if self.path == "-":
+            print(line, flush=True)
+            return
+        with open(self.path, "a") as stream_file:
+            stream_file.write(line + "\n")
+
+    @staticmethod
+    def scenario(result: TeamResult) -> dict:
+        # Every team's total, and its points and placement (0-based, -1 for none) from each column of the snapshot:
+        # every transfer window, and the final placement, GS1 and GS2 of every tournament, in season order
+        snapshot = result.snapshot
+        totals = snapshot.totals()
+        return {team_name: {"total": int(totals[i]),
+                            "points": snapshot.points[i].tolist(),
+                            "places": snapshot.places[i].tolist()}
+                for i, team_name in enumerate(snapshot.team_names)}
@@ -0,0 +1,69 @@
+import numpy as np
+
+from teams import TeamDatabase
+from transfer_window import TransferWindow
+from unoptimised_model import UnoptimisedModel
+
+
+class Snapshot:
+    # Picklable scenario of one solve, read straight off the placement indicators, so nothing needs the solver or the
+    # model once the solve is over. One column per transfer window, and one per stage of each tournament (final
+    # placement, GS1, then GS2), in season order
+    def __init__(self, team_names: [str], event_columns: [int], points: np.ndarray, places: np.ndarray):
+        self.team_names = team_names
+        # Number of columns each event takes up
+        self.event_columns = event_columns
+        # Teams by columns
+        self.points = points
+        # Placement (0-based) the team finished the stage in, or its position within its group for GS1 and GS2 (A1 and
+        # B1 are both 0); -1 for transfer windows and teams not taking part
+        self.places = places
+
+    def totals(self) -> np.ndarray:
+        return self.points.sum(axis=1)
+
+    def as_dict(self) -> dict:
+        return {"team_names": self.team_names, "event_columns": self.event_columns,
+                "points": self.points.tolist(), "places": self.places.tolist()}
+
+    @staticmethod
+    def from_dict(value: dict) -> 'Snapshot':
+        return Snapshot(team_names=value["team_names"], event_columns=value["event_columns"],
+                        points=np.array(value["points"], dtype=np.int32),
+                        places=np.array(value["places"], dtype=np.int16))
+
+    @staticmethod
+    def from_solution(solution: [int], unoptimised_model: UnoptimisedModel,
+                      team_database: TeamDatabase) -> 'Snapshot':
+        team_count = len(team_database.get_all_teams())
+        points_columns: [np.ndarray] = []
+        places_columns: [np.ndarray] = []
+        event_columns: [int] = []
+        for event_model in unoptimised_model.events:
+            if isinstance(event_model, TransferWindow):
+                points_columns.append(np.array(event_model.as_table(), dtype=np.int32))
+                places_columns.append(np.full(team_count, -1, dtype=np.int16))
+                event_columns.append(1)
+                continue
+
+            stages = [stage for stage in event_model.stages() if stage[0] is not None]
+            # GS1 is two groups side by side, so its placements go A1, B1, A2, B2, etc.
+            group_counts = [1, 2, 1]
+            for (indicators, _, buckets), group_count in zip(stages, group_counts):
+                points = np.zeros(team_count, dtype=np.int32)
+                places = np.full(team_count, -1, dtype=np.int16)
+                for i in range(team_count):
+                    for b, indicator in enumerate(indicators[i]):
+                        # Indicators ruled out (or in) when the model was built are plain ints
+                        if (indicator if isinstance(indicator, int) else solution[indicator.index]) == 1:
+                            points[i] = buckets[b].points
+                            places[i] = buckets[b].best // group_count
+                            break
+                points_columns.append(points)
+                places_columns.append(places)
+            event_columns.append(len(stages))
+
+        return Snapshot(team_names=[team.name for team in team_database.get_all_teams()],
+                        event_columns=event_columns,
+                        points=np.stack(points_columns, axis=1),
+                        places=np.stack(places_columns, axis=1))
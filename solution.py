@@ -0,0 +1,10 @@
+from ortools.sat.python import cp_model_helper
+
+
+def solution_value(solution: [int], expression) -> int:
+    # Evaluates a variable or linear expression against a stored assignment, as CpSolver.Value does for a live solve
+    if isinstance(expression, int):
+        return expression
+    flat_expression = cp_model_helper.FlatIntExpr(expression)
+    return flat_expression.offset + sum(coefficient * solution[variable.index] for variable, coefficient in
+                                        zip(flat_expression.vars, flat_expression.coeffs))
@@ -0,0 +1,110 @@
+import argparse
+import copy
+import json
+import time
+
+from ortools.sat.python.cp_model import CpSolver
+
+
+class SolverConfig:
+    def __init__(self,
+                 num_workers: int = 0,
+                 time_limit: float = None,
+                 global_time_limit: float = None,
+                 random_seed: int = None,
+                 relative_gap: float = None,
+                 absolute_gap: float = None,
+                 presolve: bool = True,
+                 presolve_iterations: int = None):
+        # 0 lets CP-SAT use every core
+        self.num_workers = num_workers
+        # Seconds per solve
+        self.time_limit = time_limit
+        # Seconds for the whole run, shared between all solves
+        self.global_time_limit = global_time_limit
+        self.random_seed = random_seed
+        self.relative_gap = relative_gap
+        self.absolute_gap = absolute_gap
+        self.presolve = presolve
+        self.presolve_iterations = presolve_iterations
+
+        # Wall-clock time (not monotonic) so that the deadline means the same thing in every pool process
+        self.deadline: float | None = None
+
+    def start(self):
+        if self.global_time_limit is not None:
+            self.deadline = time.time() + self.global_time_limit
+
+    def remaining_time(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.time())
+
+    def out_of_time(self) -> bool:
+        remaining_time = self.remaining_time()
+        return remaining_time is not None and remaining_time <= 0
+
+    def gap_limited(self) -> bool:
+        # CP-SAT may then stop short of the optimum and still report OPTIMAL, so an objective is only a lower bound
+        return bool(self.relative_gap) or bool(self.absolute_gap)
+
+    def with_num_workers(self, num_workers: int) -> 'SolverConfig':
+        solver_config = copy.copy(self)
+        solver_config.num_workers = num_workers
+        return solver_config
+
+    def apply(self, solver: CpSolver):
+        solver.parameters.num_workers = self.num_workers
+
+        time_limits = [limit for limit in [self.time_limit, self.remaining_time()] if limit is not None]
+        if len(time_limits) > 0:
+            solver.parameters.max_time_in_seconds = min(time_limits)
+        if self.random_seed is not None:
+            solver.parameters.random_seed = self.random_seed
+        if self.relative_gap is not None:
+            solver.parameters.relative_gap_limit = self.relative_gap
+        if self.absolute_gap is not None:
+            solver.parameters.absolute_gap_limit = self.absolute_gap
+        solver.parameters.cp_model_presolve = self.presolve
+        if self.presolve_iterations is not None:
+            solver.parameters.max_presolve_iterations = self.presolve_iterations
+
+    @staticmethod
+    def from_file(path: str) -> 'SolverConfig':
+        # JSON object using the constructor's argument names, e.g. {"num_workers": 8, "time_limit": 30}
+        with open(path) as config_file:
+            return SolverConfig(**json.load(config_file))
+
+    @staticmethod
+    def add_arguments(parser: argparse.ArgumentParser):
+        group = parser.add_argument_group("solver")
+        group.add_argument("--solver-config", help="JSON file of solver settings; flags below override it")
+        group.add_argument("--num-search-workers", type=int, help="CP-SAT search workers per solve (0 = all cores)")
+        group.add_argument("--time-limit", type=float, help="Seconds allowed for each solve")
+        group.add_argument("--global-time-limit", type=float, help="Seconds allowed for the whole run")
+        group.add_argument("--random-seed", type=int)
+        group.add_argument("--relative-gap", type=float)
+        group.add_argument("--absolute-gap", type=float)
+        group.add_argument("--no-presolve", action="store_true")
+        group.add_argument("--presolve-iterations", type=int)
+
+    @staticmethod
+    def from_args(args: argparse.Namespace) -> 'SolverConfig':
+        solver_config = SolverConfig() if args.solver_config is None else SolverConfig.from_file(args.solver_config)
+        if args.num_search_workers is not None:
+            solver_config.num_workers = args.num_search_workers
+        if args.time_limit is not None:
+            solver_config.time_limit = args.time_limit
+        if args.global_time_limit is not None:
+            solver_config.global_time_limit = args.global_time_limit
+        if args.random_seed is not None:
+            solver_config.random_seed = args.random_seed
+        if args.relative_gap is not None:
+            solver_config.relative_gap = args.relative_gap
+        if args.absolute_gap is not None:
+            solver_config.absolute_gap = args.absolute_gap
+        if args.no_presolve:
+            solver_config.presolve = False
+        if args.presolve_iterations is not None:
+            solver_config.presolve_iterations = args.presolve_iterations
+        return solver_config
@@ -0,0 +1,154 @@
+import random
+
+from ept import EPT
+from qualifier import Qualifier
+from rank_encoding import RankEncoding
+from region import Region
+from teams import Team, TeamDatabase
+from tournament import SolvedTournament
+from transfer_window import TransferWindow
+
+
+class SyntheticSeason:
+    # A randomly generated season made of the same classes as the real one, for seeing how the model scales.
+    # The whole season's results are drawn up front, and known_fraction reveals its stages in order: each event's
+    # qualifiers (with the group draw), GS1, GS2 if it has one, then the playoffs
+    def __init__(self, team_count: int = 22, event_sizes: [int] = None, group_stages: [int] = None,
+                 known_fraction: float = 0.0, seed: int = 0):
+        self.team_count = team_count
+        self.event_sizes = [16, 12] if event_sizes is None else event_sizes
+        self.group_stages = [2, 1] if group_stages is None else group_stages
+        self.known_fraction = known_fraction
+        self.seed = seed
+
+        if len(self.event_sizes) != len(self.group_stages):
+            raise ValueError("Every event needs a size and a number of group stages")
+        for event_size, group_stages in zip(self.event_sizes, self.group_stages):
+            # Two groups, each split in half by GS1, and GS2 split in half again by the playoffs
+            divisor = 8 if group_stages == 2 else 4
+            if group_stages not in [1, 2] or event_size % divisor != 0:
+                raise ValueError(f"An event with {group_stages} group stages cannot have {event_size} teams")
+            if event_size > team_count:
+                raise ValueError(f"An event with {event_size} teams needs at least as many teams in the season")
+        if not 0 <= known_fraction <= 1:
+            raise ValueError(f"known_fraction must be between 0 and 1, not {known_fraction}")
+
+    def name(self) -> str:
+        return (f"synthetic_t{self.team_count}_e{'-'.join(map(str, self.event_sizes))}"
+                f"_g{'-'.join(map(str, self.group_stages))}_k{self.known_fraction}_s{self.seed}")
+
+    def definition(self) -> dict:
+        return {"team_count": self.team_count, "event_sizes": self.event_sizes, "group_stages": self.group_stages,
+                "known_fraction": self.known_fraction, "seed": self.seed}
+
+    def stage_count(self) -> int:
+        return sum(2 + group_stages for group_stages in self.group_stages)
+
+    def build(self, rank_encoding: RankEncoding = RankEncoding.BIG_M) -> EPT:
+        rng = random.Random(self.seed)
+        team_database = TeamDatabase()
+        for i in range(self.team_count):
+            team_database.add_team(Team(f"Team {i + 1}"))
+
+        known_stages = round(self.known_fraction * self.stage_count())
+        events: [SolvedTournament | TransferWindow] = []
+        for e in range(len(self.event_sizes)):
+            if e > 0:
+                events.append(self.transfer_window(team_database, rng))
+            events.append(self.tournament(e, team_database, rng, known_stages))
+            known_stages = max(0, known_stages - (2 + self.group_stages[e]))
+
+        return EPT(events=events, team_database=team_database, rank_encoding=rank_encoding)
+
+    def tournament(self, e: int, team_database: TeamDatabase, rng: random.Random,
+                   known_stages: int) -> SolvedTournament:
+        event_size = self.event_sizes[e]
+        two_group_stages = self.group_stages[e] == 2
+        teams = team_database.get_all_teams()
+
+        # Stronger (lower numbered) teams get the invites, and everyone else is spread over the regions
+        invited_teams = rng.sample(teams[:event_size], event_size // 2)
+        regions = list(Region)
+        candidates: dict[Region, [Team]] = {region: [] for region in regions}
+        for i, team in enumerate(teams):
+            if team not in invited_teams:
+                candidates[regions[i % len(regions)]].append(team)
+        slots: dict[Region, int] = {region: 0 for region in regions}
+        remaining_slots = event_size - len(invited_teams)
+        while remaining_slots > 0:
+            for region in regions:
+                if remaining_slots > 0 and len(candidates[region]) > slots[region]:
+                    slots[region] += 1
+                    remaining_slots -= 1
+        qualified_teams = {region: rng.sample(candidates[region], slots[region]) for region in regions}
+
+        qualifiers_known = known_stages >= 1
+        qualifiers = {region: Qualifier(region=region,
+                                        teams=qualified_teams[region] if qualifiers_known else candidates[region],
+                                        num_qualified=slots[region])
+                      for region in regions if slots[region] > 0}
+
+        # Draw the groups and every stage's result, whether or not they are revealed
+        participants = invited_teams + [team for region in regions for team in qualified_teams[region]]
+        rng.shuffle(participants)
+        gs1_a_teams = participants[0::2]
+        gs1_b_teams = participants[1::2]
+        # A1, B1, A2, B2, etc.
+        gs1_order = [team for pair in zip(gs1_a_teams, gs1_b_teams) for team in pair]
+        gs1_team_count = event_size // 2
+        gs2_team_count = None
+        gs2_order = None
+        if two_group_stages:
+            gs2_team_count = event_size // 2
+            playoff_team_count = event_size // 4
+            gs2_order = rng.sample(gs1_order[:gs1_team_count], gs2_team_count)
+            final_order = rng.sample(gs2_order[:playoff_team_count], playoff_team_count) + \
+                gs2_order[playoff_team_count:] + gs1_order[gs1_team_count:]
+        else:
+            playoff_team_count = event_size * 2 // 3
+            final_order = rng.sample(gs1_order[:gs1_team_count], gs1_team_count) + gs1_order[gs1_team_count:]
+
+        points = self.point_table(event_size, 4800 * event_size // 16)
+        tournament = SolvedTournament(name=f"Event {e + 1}", link=f"Event {e + 1}", icon=f"Event {e + 1}",
+                                      team_count=event_size,
+                                      invited_teams=invited_teams,
+                                      qualifiers=qualifiers,
+                                      points=points,
+                                      gs1_points=[300 // 2 ** p for p in range(event_size // 8 + 1)],
+                                      gs2_points=[300] * max(1, event_size // 16) if two_group_stages else None,
+                                      gs1_team_count=gs1_team_count,
+                                      gs2_team_count=gs2_team_count,
+                                      playoff_team_count=playoff_team_count,
+                                      gs1_a_teams=gs1_a_teams if qualifiers_known else None,
+                                      gs1_b_teams=gs1_b_teams if qualifiers_known else None,
+                                      gs2_teams=gs2_order if two_group_stages and known_stages >= 2 else None,
+                                      team_database=team_database)
+
+        if known_stages >= 2:
+            for p, team in enumerate(gs1_order):
+                tournament.team_can_finish_between_gs1(team.name, p - p % 2 + 1, p - p % 2 + 2)
+        if two_group_stages and known_stages >= 3:
+            for p, team in enumerate(gs2_order):
+                tournament.team_can_finish_between_gs2(team.name, p + 1, p + 1)
+        if known_stages >= 2 + self.group_stages[e]:
+            for p, team in enumerate(final_order):
+                # Placements worth the same points are not told apart, as with a shared 5th-6th
+                tied = [q for q in range(event_size) if points[q] == points[p]]
+                tournament.team_can_finish_between(team.name, tied[0] + 1, tied[-1] + 1)
+
+        return tournament
+
+    def transfer_window(self, team_database: TeamDatabase, rng: random.Random) -> TransferWindow:
+        transfer_window = TransferWindow(team_database=team_database)
+        for team in rng.sample(team_database.get_all_teams(), max(1, self.team_count // 8)):
+            transfer_window.add_change(team.name, rng.choice([-675, -125, -30, 30]))
+        return transfer_window
+
+    @staticmethod
+    def point_table(event_size: int, first_place: int) -> [int]:
+        # The top four are told apart, then placements pay out in tied pairs, each a fraction of the one above
+        point_table: [int] = []
+        for p in range(event_size):
+            step = p if p < 4 else 4 + (p - 4) // 2
+            point_table.append(round(first_place * 0.75 ** step / 10) * 10)
+        return point_table
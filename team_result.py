@@ -0,0 +1,30 @@
+from ortools.sat.python.cp_model import CpSolverStatus
+
+from snapshot import Snapshot
+from solution import solution_value
+
+
+class TeamResult:
+    # Picklable outcome of a single team's solve, so it can cross process boundaries
+    def __init__(self, team_name: str, status: CpSolverStatus, objective_value: float, solution: [int],
+                 bound: int = None, skipped: bool = False, cutoff: int = None, seconds: float = None,
+                 snapshot: Snapshot = None):
+        self.team_name = team_name
+        self.status = status
+        self.objective_value = objective_value
+        # Value of every variable in the model, indexed by proto variable index. Only kept for hinting later solves,
+        # and otherwise empty
+        self.solution = solution
+        # Most points the team could score at all; skipped teams could not beat the best threshold
+        self.bound = bound
+        self.skipped = skipped
+        # Best threshold the team had to beat; INFEASIBLE with a cutoff means "not better" rather than "cannot happen"
+        self.cutoff = cutoff
+        # Wall-clock time of the solve itself; None when nothing was solved
+        self.seconds = seconds
+        # The scenario found, for display; None unless OPTIMAL
+        self.snapshot = snapshot
+
+    def Value(self, expression) -> int:
+        # Same contract as CpSolver.Value so Display can read from a result instead of a live solver
+        return solution_value(self.solution, expression)
@@ -1,4 +1,6 @@
 class Team:
+    __slots__ = ("name", "ept_relevant")
+
     def __init__(self, name: str = None):
         self.name = name
         self.ept_relevant = False
@@ -9,25 +11,35 @@ class Team:
 
 class TeamDatabase:
     def __init__(self):
-        self.teams = {}
+        # A team's position in this list is its index in every model row, and never changes once added
+        self.teams: [Team] = []
+        self.team_indices: dict[str, int] = {}
 
     def add_team(self, team: Team):
-        self.teams[team.name] = team
+        if team.name in self.team_indices:
+            self.teams[self.team_indices[team.name]] = team
+            return
+
+        self.team_indices[team.name] = len(self.teams)
+        self.teams.append(team)
 
     def get_team_by_name(self, team_name: str) -> Team:
-        if self.teams.get(team_name) is None:
+        if self.team_indices.get(team_name) is None:
             raise Exception(f"No such team {team_name}")
 
-        return self.teams[team_name]
+        return self.teams[self.team_indices[team_name]]
 
     def get_teams_by_names(self, *team_names: str) -> [Team]:
         return list(map(self.get_team_by_name, team_names))
 
     def get_team_index(self, team: Team) -> int:
-        return list(self.teams.keys()).index(team.name)
+        return self.get_team_index_by_team_name(team.name)
 
     def get_team_index_by_team_name(self, team_name: str) -> int:
-        return list(self.teams.keys()).index(team_name)
+        if self.team_indices.get(team_name) is None:
+            raise ValueError(f"{team_name} is not in team database")
+
+        return self.team_indices[team_name]
 
     def get_all_teams(self) -> [Team]:
-        return self.teams.values()
\ No newline at end of file
+        return self.teams
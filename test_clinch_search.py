@@ -0,0 +1,21 @@
+import pytest
+
+from clinch_search import ClinchSearch
+from rank_encoding import RankEncoding
+from synthetic_season import SyntheticSeason
+
+
+def standings(season: SyntheticSeason, rank_encoding: RankEncoding, top_ns: [int]) -> dict[(str, int), str]:
+    ept = season.build(rank_encoding)
+    results_by_top_n = ClinchSearch(ept).run(ept.team_database.get_all_teams(), top_ns)
+    return {(result.team_name, top_n): result.standing()
+            for top_n, results in results_by_top_n.items() for result in results}
+
+
+# Seasons where some teams can only reach the top 2 by tying on points
+@pytest.mark.parametrize("seed, known_fraction", [(1, 0.5), (1, 0.75), (3, 0.5), (3, 0.75)])
+def test_clinch_table_matches_across_rank_encodings(seed: int, known_fraction: float):
+    season = SyntheticSeason(team_count=16, event_sizes=[16, 12], group_stages=[2, 1], known_fraction=known_fraction,
+                             seed=seed)
+    top_ns = [2, 4]
+    assert standings(season, RankEncoding.BIG_M, top_ns) == standings(season, RankEncoding.COUNTING, top_ns)
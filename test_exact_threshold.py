@@ -0,0 +1,37 @@
+import pytest
+
+from exact_threshold import ExactThreshold, TooManyStates
+from synthetic_season import SyntheticSeason
+from threshold_search import ThresholdSearch
+
+
+def seasons() -> [SyntheticSeason]:
+    # Small seasons where every event but the last is resolved, from the last event's groups being drawn to it being
+    # over
+    seasons = []
+    for team_count in [16, 22]:
+        for seed in [0, 1]:
+            season = SyntheticSeason(team_count=team_count, event_sizes=[16, 12], group_stages=[2, 1], seed=seed)
+            last_event_stages = 2 + season.group_stages[-1]
+            for known_stages in range(season.stage_count() - last_event_stages + 1, season.stage_count() + 1):
+                seasons.append(SyntheticSeason(team_count=team_count, event_sizes=season.event_sizes,
+                                               group_stages=season.group_stages,
+                                               known_fraction=known_stages / season.stage_count(), seed=seed))
+    return seasons
+
+
+@pytest.mark.parametrize("top_n", [4, 8])
+@pytest.mark.parametrize("season", seasons(), ids=lambda season: season.name())
+def test_exact_threshold_matches_cp_sat(season: SyntheticSeason, top_n: int):
+    ept = season.build()
+    exact_threshold = ExactThreshold(ept)
+    assert exact_threshold.applicable()
+    try:
+        outcomes = [exact_threshold.optimise_for(team, top_n) for team in ept.team_database.get_all_teams()]
+    except TooManyStates:
+        pytest.skip("Too much of the last event is undecided to solve it exactly")
+    exact_points = max((outcome.total_points for outcome in outcomes if outcome is not None), default=None)
+
+    threshold_search = ThresholdSearch(ept=ept, top_n=top_n, exact=False)
+    max_result = threshold_search.best(threshold_search.run_single())
+    assert exact_points == (None if max_result is None else round(max_result.objective_value))
@@ -0,0 +1,433 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from ortools.sat.python import cp_model
+from ortools.sat.python.cp_model import CpModel
+
+from ept import EPT
+from exact_threshold import ExactThreshold, ExactOutcome, TooManyStates
+from profiler import Profiler
+from result_cache import ResultCache
+from result_stream import ResultStream
+from snapshot import Snapshot
+from solver_config import SolverConfig
+from team_result import TeamResult
+from teams import Team
+from unoptimised_model import UnoptimisedTournamentModel
+
+
+class ModelTemplate:
+    # The season model is built once and cloned for each team's solve
+    def __init__(self, ept: EPT, profiler: Profiler = None):
+        self.model = CpModel()
+        self.unoptimised_model = ept.add_constraints(self.model, profiler)
+
+
+class ThresholdSearch:
+    def __init__(self, ept: EPT, top_n: int, workers: int = 1, solver_config: SolverConfig = None,
+                 warm_start: bool = False, incumbent_cutoff: bool = False, result_cache: ResultCache = None,
+                 profiler: Profiler = None, exact: bool = True, result_stream: ResultStream = None):
+        self.ept = ept
+        self.top_n = top_n
+        self.workers = workers
+        # Hint each solve with the scenario from the most recently finished one
+        self.warm_start = warm_start
+        # Require each solve to beat the best threshold so far
+        self.incumbent_cutoff = incumbent_cutoff
+        self.result_cache = result_cache
+        self.solver_config = SolverConfig() if solver_config is None else solver_config
+        self.profiler = Profiler() if profiler is None else profiler
+        self.result_stream = ResultStream() if result_stream is None else result_stream
+        self.template = ModelTemplate(ept, self.profiler)
+        # Results from the previous cutoff of a sweep, by team name
+        self.previous_results: dict[str, TeamResult] = {}
+        # Once at most one tournament is still open the threshold is found exactly, without CP-SAT
+        exact_threshold = ExactThreshold(ept) if exact else None
+        self.exact_threshold = exact_threshold if exact_threshold is not None and exact_threshold.applicable() else None
+        # A what-if on top of the season: sets of placement indicators one of which must be set (see
+        # EPT.add_conditions), and a points change per team
+        self.conditions: [[int]] = []
+        self.changes: [int] = None
+        # Kept open between runs by open_pool, so the processes and their templates are already warm
+        self.executor: ProcessPoolExecutor | None = None
+
+    def run(self, teams: [Team], previous_results: [TeamResult] = None) -> [TeamResult]:
+        # previous_results are from a smaller top N, when sweeping
+        self.previous_results = {} if previous_results is None else \
+            {result.team_name: result for result in previous_results}
+        # Most promising teams first, so the best threshold rises quickly and prunes the rest
+        bounds: dict[str, int] = {team.name: self.bound(team) for team in teams}
+        team_names = sorted(bounds, key=lambda team_name: bounds[team_name], reverse=True)
+        if self.exact_threshold is not None:
+            results = self.run_exact(team_names, bounds)
+            if results is not None:
+                return results
+        if self.workers <= 1:
+            return self.run_sequential(team_names, bounds)
+        return self.run_parallel(team_names, bounds)
+
+    def run_single(self, upper_bound: int = None) -> [TeamResult]:
+        if self.exact_threshold is not None:
+            self.previous_results = {}
+            bounds: dict[str, int] = {team.name: self.bound(team) for team in self.ept.team_database.get_all_teams()}
+            results = self.run_exact(sorted(bounds, key=lambda team_name: bounds[team_name], reverse=True), bounds)
+            if results is not None:
+                max_result = self.best(results)
+                return [] if max_result is None else [max_result]
+
+        print(f"Now optimising the (top {self.top_n} + 1)-th highest total")
+        [solver, status, team] = self.ept.optimise_threshold(unoptimised_model=self.template.unoptimised_model,
+                                                              model=self.template.model,
+                                                              top_n=self.top_n,
+                                                              solver_config=self.solver_config,
+                                                              upper_bound=upper_bound,
+                                                              profiler=self.profiler)
+        if status != cp_model.OPTIMAL:
+            return []
+
+        solution = list(solver.response_proto.solution)
+        results = []
+        self.add(results, TeamResult(team_name=team.name,
+                                     status=status,
+                                     objective_value=solver.objective_value,
+                                     solution=solution if self.warm_start else [],
+                                     seconds=solver.wall_time,
+                                     snapshot=Snapshot.from_solution(solution, self.template.unoptimised_model,
+                                                                     self.ept.team_database)))
+        return results
+
+    def sweep(self, teams: [Team], top_ns: [int], single_solve: bool = False) -> dict[int, [TeamResult]]:
+        # Every cutoff shares the one template. A team outside the top N + k is also outside the top N, so thresholds
+        # only fall as N grows: going from the smallest N up, each team's previous optimum bounds its next one, and
+        # teams that could not finish outside a smaller top N are not solved again
+        results_by_top_n: dict[int, [TeamResult]] = {}
+        previous_results: [TeamResult] = None
+        # The global time limit covers every cutoff, not each one
+        self.solver_config.start()
+        for top_n in sorted(set(top_ns)):
+            self.top_n = top_n
+            if single_solve:
+                # A gap-limited threshold may be below the true one, so it cannot bound the next
+                max_result = None if previous_results is None or self.solver_config.gap_limited() else \
+                    self.best(previous_results)
+                results = self.run_single(None if max_result is None else round(max_result.objective_value))
+            else:
+                results = self.run(teams, previous_results)
+            results_by_top_n[top_n] = results
+            previous_results = results
+        return results_by_top_n
+
+    def run_sequential(self, team_names: [str], bounds: dict[str, int]) -> [TeamResult]:
+        results = []
+        for team_name in team_names:
+            skipped_result = self.skip(team_name, bounds[team_name], results)
+            if skipped_result is not None:
+                self.add(results, skipped_result)
+                continue
+
+            result = self.cached(team_name)
+            if result is None:
+                result = optimise_team(self.ept, self.template, team_name, self.top_n, self.solver_config,
+                                       self.hint(results, team_name), self.cutoff(results), self.profiler,
+                                       self.warm_start, self.conditions, self.changes)
+                self.store(result)
+            result.bound = bounds[team_name]
+            self.add(results, result)
+        return results
+
+    def run_exact(self, team_names: [str], bounds: dict[str, int]) -> [TeamResult]:
+        # None if the open tournament turns out to be too undecided to be worth solving exactly
+        print("At most one tournament is still open, so solving it exactly")
+        try:
+            return self.run_exact_teams(team_names, bounds)
+        except TooManyStates:
+            print("Too much of the open tournament is undecided to solve it exactly, so using CP-SAT")
+            self.exact_threshold = None
+            return None
+
+    def run_exact_teams(self, team_names: [str], bounds: dict[str, int]) -> [TeamResult]:
+        results = []
+        for team_name in team_names:
+            skipped_result = self.skip(team_name, bounds[team_name], results)
+            if skipped_result is not None:
+                self.add(results, skipped_result)
+                continue
+
+            # Each team only has to beat the best threshold so far, as there is no search for a cutoff to slow down
+            max_result = self.best(results)
+            cutoff = None if max_result is None else round(max_result.objective_value)
+            team = self.ept.team_database.get_team_by_name(team_name)
+            print(f"Now optimising for {team.name}")
+            start = time.perf_counter()
+            with self.profiler.phase("exact_solve", team=team.name, top_n=self.top_n, cutoff=cutoff):
+                outcome = self.exact_threshold.optimise_for(team, self.top_n, cutoff)
+            seconds = time.perf_counter() - start
+            if outcome is None:
+                if cutoff is None:
+                    print(f"Team {team.name} cannot finish outside of top {self.top_n}")
+                else:
+                    print(f"Team {team.name} cannot beat {cutoff} points")
+                self.add(results, TeamResult(team_name=team.name, status=cp_model.INFEASIBLE, objective_value=-1,
+                                             solution=[], bound=bounds[team_name], cutoff=cutoff, seconds=seconds))
+                continue
+
+            solution = self.exact_solution(outcome)
+            self.add(results, TeamResult(team_name=team.name,
+                                         status=cp_model.OPTIMAL,
+                                         objective_value=outcome.total_points,
+                                         solution=solution if self.warm_start else [],
+                                         bound=bounds[team_name],
+                                         cutoff=cutoff,
+                                         seconds=seconds,
+                                         snapshot=Snapshot.from_solution(solution, self.template.unoptimised_model,
+                                                                         self.ept.team_database)))
+        return results
+
+    def exact_solution(self, outcome: ExactOutcome) -> [int]:
+        # The placement indicators of the template set as the exact outcome has them, so it can be snapshotted (and
+        # hinted from) like any CP-SAT solution. Nothing else in the template is set, as nothing else is read from it
+        solution = [0] * len(self.template.model.proto.variables)
+        tournament_models = [event_model for event_model in self.template.unoptimised_model.events
+                             if isinstance(event_model, UnoptimisedTournamentModel)]
+        for tournament_model, paths in zip(tournament_models, outcome.paths):
+            for i, path in enumerate(paths):
+                for (indicators, _, _), b in zip(tournament_model.stages(),
+                                                 [path.final_bucket, path.gs1_bucket, path.gs2_bucket]):
+                    if b is not None and not isinstance(indicators[i][b], int):
+                        solution[indicators[i][b].index] = 1
+        return solution
+
+    def run_parallel(self, team_names: [str], bounds: dict[str, int]) -> [TeamResult]:
+        results = []
+        solver_config = split_cores(self.solver_config, self.workers)
+        with self.pool() as executor:
+            remaining = deque(team_names)
+            pending = set()
+            while remaining or pending:
+                # Only keep as many teams in flight as there are workers, so later teams are pruned against the
+                # best threshold found so far rather than the one at start-up
+                while remaining and len(pending) < self.workers:
+                    team_name = remaining.popleft()
+                    skipped_result = self.skip(team_name, bounds[team_name], results)
+                    if skipped_result is not None:
+                        self.add(results, skipped_result)
+                        continue
+                    cached_result = self.cached(team_name)
+                    if cached_result is not None:
+                        cached_result.bound = bounds[team_name]
+                        self.add(results, cached_result)
+                        continue
+                    pending.add(executor.submit(run_in_worker, optimise_team, team_name, self.top_n, solver_config,
+                                                self.hint(results, team_name), self.cutoff(results),
+                                                keep_solution=self.warm_start, conditions=self.conditions,
+                                                changes=self.changes))
+
+                if not pending:
+                    continue
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    self.store(result)
+                    result.bound = bounds[result.team_name]
+                    self.add(results, result)
+        return results
+
+    def pool(self) -> ProcessPoolExecutor | nullcontext:
+        if self.executor is not None:
+            return nullcontext(self.executor)
+        return self.new_pool()
+
+    def new_pool(self) -> ProcessPoolExecutor:
+        return new_template_pool(self.ept, self.template, self.workers, self.profiler)
+
+    def open_pool(self):
+        if self.executor is None and self.workers > 1:
+            self.executor = self.new_pool()
+
+    def close_pool(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def add(self, results: [TeamResult], result: TeamResult):
+        # Streamed as each result comes in, which in parallel is the order the workers finish in
+        results.append(result)
+        self.result_stream.write(result, self.top_n)
+
+    def bound(self, team: Team) -> int:
+        bound = self.ept.max_points_obtainable(team)
+        if self.changes is not None:
+            bound += self.changes[self.ept.team_database.get_team_index(team)]
+        if self.exact_threshold is not None:
+            bound = min(bound, self.exact_threshold.bound(team))
+        previous_result = self.previous_results.get(team.name)
+        if previous_result is None:
+            return bound
+        if previous_result.status == cp_model.OPTIMAL and not self.solver_config.gap_limited():
+            return min(bound, round(previous_result.objective_value))
+        if previous_result.status == cp_model.INFEASIBLE and previous_result.cutoff is not None:
+            # It could not beat the cutoff with a smaller top N, so cannot with this one either
+            return min(bound, previous_result.cutoff)
+        if previous_result.skipped and previous_result.status == cp_model.UNKNOWN:
+            return min(bound, previous_result.bound)
+        return bound
+
+    def hint(self, results: [TeamResult], team_name: str) -> [int]:
+        if not self.warm_start:
+            return None
+
+        # The team's own scenario from a smaller top N only needs a few more teams pushed ahead of it
+        # Cached results may have been stored without their solution
+        previous_result = self.previous_results.get(team_name)
+        if previous_result is not None and previous_result.status == cp_model.OPTIMAL and \
+                len(previous_result.solution) > 0:
+            return previous_result.solution
+
+        for result in reversed(results):
+            if result.status == cp_model.OPTIMAL and len(result.solution) > 0:
+                return result.solution
+        return None
+
+    def cutoff(self, results: [TeamResult]) -> int:
+        if not self.incumbent_cutoff:
+            return None
+
+        max_result = self.best(results)
+        if max_result is None:
+            return None
+        return round(max_result.objective_value)
+
+    def cached(self, team_name: str) -> TeamResult | None:
+        if self.result_cache is None:
+            return None
+
+        result = self.result_cache.get(self.cache_key(team_name), len(self.template.model.proto.variables))
+        if result is not None:
+            print(f"Using cached result for {team_name}")
+        return result
+
+    def store(self, result: TeamResult):
+        # A gap-limited optimum is not the team's true answer, so it must not be served to runs without the gap
+        if self.result_cache is None or self.solver_config.gap_limited():
+            return
+
+        self.result_cache.put(self.cache_key(result.team_name), result, len(self.template.model.proto.variables))
+
+    def cache_key(self, team_name: str) -> str:
+        return ResultCache.key(self.ept, self.top_n, team_name, self.conditions, self.changes)
+
+    def skip(self, team_name: str, bound: int, results: [TeamResult]) -> TeamResult | None:
+        previous_result = self.previous_results.get(team_name)
+        if previous_result is not None and previous_result.status == cp_model.INFEASIBLE and \
+                previous_result.cutoff is None:
+            print(f"Skipping {team_name} as it cannot finish outside of a smaller top N")
+            return TeamResult(team_name=team_name, status=cp_model.INFEASIBLE, objective_value=-1, solution=[],
+                              bound=bound, skipped=True)
+
+        if self.solver_config.out_of_time():
+            print(f"Skipping {team_name} as the global time limit has been reached")
+            return TeamResult(team_name=team_name, status=cp_model.UNKNOWN, objective_value=-1, solution=[],
+                              bound=bound, skipped=True)
+
+        max_result = self.best(results)
+        if max_result is not None and bound <= max_result.objective_value:
+            print(f"Skipping {team_name} as {bound} <= {round(max_result.objective_value)}")
+            return TeamResult(team_name=team_name, status=cp_model.UNKNOWN, objective_value=-1, solution=[],
+                              bound=bound, skipped=True)
+
+        return None
+
+    @staticmethod
+    def best(results: [TeamResult]) -> TeamResult | None:
+        max_result = None
+        for result in results:
+            if result.status != cp_model.OPTIMAL:
+                continue
+
+            if max_result is None or result.objective_value > max_result.objective_value:
+                max_result = result
+        return max_result
+
+
+def split_cores(solver_config: SolverConfig, workers: int) -> SolverConfig:
+    # Split the cores between processes rather than letting every CP-SAT instance grab all of them
+    if solver_config.num_workers != 0 or workers <= 1:
+        return solver_config
+    return solver_config.with_num_workers(max(1, (os.cpu_count() or 1) // workers))
+
+
+def new_template_pool(ept: EPT, template: ModelTemplate, workers: int, profiler: Profiler) -> ProcessPoolExecutor:
+    # A forked process starts with a copy of this one's memory, so it can take the template as it is rather than
+    # building its own. Process arguments are not pickled when forking, which the CP-SAT model could not be
+    if "fork" in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context("fork")
+    else:
+        mp_context = None
+        template = None
+    return ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker,
+                               initargs=(ept, profiler, template))
+
+
+# Each pool process gets its own template once and reuses it for every solve it is sent
+_worker_ept: EPT | None = None
+_worker_template: ModelTemplate | None = None
+_worker_profiler: Profiler | None = None
+
+
+def _init_worker(ept: EPT, profiler: Profiler, template: ModelTemplate = None):
+    global _worker_ept, _worker_template, _worker_profiler
+    _worker_ept = ept
+    _worker_profiler = profiler
+    _worker_template = ModelTemplate(ept, profiler) if template is None else template
+
+
+def run_in_worker(function, *args, **kwargs):
+    # function(ept, template, *args, profiler=...) against this pool process's season and template, e.g.
+    # optimise_team or clinch_search.check_team
+    return function(_worker_ept, _worker_template, *args, profiler=_worker_profiler, **kwargs)
+
+
+def optimise_team(ept: EPT, template: ModelTemplate, team_name: str, top_n: int,
+                  solver_config: SolverConfig = None, hint: [int] = None, cutoff: int = None,
+                  profiler: Profiler = None, keep_solution: bool = False, conditions: [[int]] = None,
+                  changes: [int] = None) -> TeamResult:
+    # Only the snapshot leaves this function unless the solution is wanted for hinting, so a worker sends back a few
+    # small arrays rather than every variable of the model
+    team = ept.team_database.get_team_by_name(team_name)
+    print(f"Now optimising for {team.name}")
+    start = time.perf_counter()
+    [solver, status] = ept.optimise_for(team=team,
+                                        unoptimised_model=template.unoptimised_model,
+                                        model=template.model,
+                                        top_n=top_n,
+                                        solver_config=solver_config,
+                                        hint=hint,
+                                        cutoff=cutoff,
+                                        profiler=profiler,
+                                        conditions=conditions,
+                                        changes=changes)
+    seconds = time.perf_counter() - start
+
+    if status == cp_model.INFEASIBLE and cutoff is not None:
+        print(f"Team {team.name} cannot beat {cutoff} points")
+        return TeamResult(team_name=team.name, status=status, objective_value=-1, solution=[], cutoff=cutoff,
+                          seconds=seconds)
+
+    if status != cp_model.OPTIMAL:
+        print(f"Team {team.name} probably cannot finish in top {top_n}")
+        return TeamResult(team_name=team.name, status=status, objective_value=-1, solution=[], cutoff=cutoff,
+                          seconds=seconds)
+
+    solution = list(solver.response_proto.solution)
+    return TeamResult(team_name=team.name,
+                      status=status,
+                      objective_value=solver.objective_value,
+                      solution=solution if keep_solution else [],
+                      cutoff=cutoff,
+                      seconds=seconds,
+                      snapshot=Snapshot.from_solution(solution, template.unoptimised_model, ept.team_database))
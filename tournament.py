@@ -1,13 +1,18 @@
 from math import floor
 
 from ortools.constraint_solver.pywrapcp import BooleanVar
-from ortools.sat.python.cp_model import CpModel, IntVar
+from ortools.sat.python.cp_model import CpModel, LinearExprT
 
+from placement_bucket import PlacementBucket
+from presolve import Presolve, Cell
 from qualifier import Qualifier
 from region import Region
 from teams import Team, TeamDatabase
 from unoptimised_model import UnoptimisedTournamentModel
 
+# Stages as UnoptimisedTournamentModel.stages() lists them
+FINAL, GS1, GS2 = range(3)
+
 
 class ResolvedTournament:
     def __init__(self, name: str = None, link: str = None, icon: str = None, gs1_team_count: int = -1,
@@ -30,6 +35,9 @@ class TeamConstraint:
         self.best = best
         self.worst = worst
 
+    def definition(self) -> dict:
+        return {"team": self.team.name, "best": self.best, "worst": self.worst}
+
 
 class SolvedTournament:
     def __init__(self,
@@ -77,64 +85,70 @@ class SolvedTournament:
         self.team_guaranteed_playoff_lb_or_eliminated: [Team] = []
 
     def add_constraints(self, model: CpModel) -> UnoptimisedTournamentModel:
-        # x variable
-        all_team_count = len(self.team_database.get_all_teams())
-        indicators: [[BooleanVar]] = [[model.new_bool_var(f'x_{self.name}_{i}_{j}') for j in range(len(self.points))]
-                                      for i in range(all_team_count)]
+        final_buckets, gs1_buckets, gs2_buckets = self.placement_buckets()
 
-        self.basic_constraints(indicators=indicators, model=model)
-
-        # Points
-        # Overall
-        # d variable
-        obtained_points: [IntVar] = [model.new_int_var(0, 99999, f'd_{self.name}_{i}') for i in range(all_team_count)]
-        for team in self.team_database.get_all_teams():
-            team_index = self.team_database.get_team_index(team)
-            obtained_points[team_index] = sum(
-                indicators[team_index][p] * self.points[p] for p in range(len(self.points)))
+        # The constraints are collected over plain cells first, so whatever they settle is a constant before any
+        # variable is created
+        all_team_count = len(self.team_database.get_all_teams())
+        stage_buckets = [final_buckets, gs1_buckets] + ([] if gs2_buckets is None else [gs2_buckets])
+        presolve = Presolve(all_team_count, [len(buckets) for buckets in stage_buckets])
+        # Teams that cannot appear in this tournament get rows of constant zeroes
+        for team_index, team in enumerate(self.team_database.get_all_teams()):
+            if not self.can_participate(team):
+                for stage in range(len(stage_buckets)):
+                    presolve.fix_row(stage, team_index, 0)
 
-        gs1_indicators, gs1_obtained_points = self.setup_group_stage_1(model)
-        gs2_indicators = None
-        gs2_obtained_points = None
+        self.basic_constraints(presolve, FINAL, final_buckets)
+        self.setup_group_stage_1(presolve, gs1_buckets)
 
         # Bind stages together such that if you are in the tournament, you are in GS1
-        for team in self.team_database.get_all_teams():
+        for team in self.participating_teams():
             team_index = self.team_database.get_team_index(team)
-            model.Add(sum(indicators[team_index]) == sum(gs1_indicators[team_index]))
+            presolve.add_same(self.cells(FINAL, team_index, range(len(final_buckets))),
+                              self.cells(GS1, team_index, range(len(gs1_buckets))))
 
         # Bottom GS1 = final result
-        for team in self.team_database.get_all_teams():
+        for team in self.participating_teams():
             team_index = self.team_database.get_team_index(team)
-            for p in range(self.gs1_team_count, self.team_count):
-                model.Add(indicators[team_index][p] == gs1_indicators[team_index][p])
+            for b in self.buckets_between(final_buckets, self.gs1_team_count, self.team_count - 1):
+                gs1_b = self.bucket_starting_at(gs1_buckets, final_buckets[b].best)
+                presolve.add_same([(FINAL, team_index, b)], [(GS1, team_index, gs1_b)])
 
         # DreamLeague or ESL One?
         if self.gs2_team_count is not None:
-            gs2_indicators, gs2_obtained_points = self.setup_group_stage_2(model)
-            self.setup_2_group_stage_tournament(gs1_indicators, gs2_indicators, indicators, model)
+            self.setup_group_stage_2(presolve, gs2_buckets)
+            self.setup_2_group_stage_tournament(presolve, final_buckets, gs1_buckets, gs2_buckets)
         else:
             pass
 
         # Team constraints
-        for team_constraint in self.team_constraints:
-            team_sum = 0
-            for i in range(team_constraint.best, team_constraint.worst + 1):
-                team_sum += indicators[self.team_database.get_team_index(team_constraint.team)][i]
-            model.Add(team_sum == 1)
+        self.add_team_constraints(self.team_constraints, presolve, FINAL, final_buckets)
 
         # GS1 constraints
-        for team_gs1_constraint in self.team_gs1_constraints:
-            team_sum = 0
-            for i in range(team_gs1_constraint.best, team_gs1_constraint.worst + 1):
-                team_sum += gs1_indicators[self.team_database.get_team_index(team_gs1_constraint.team)][i]
-            model.Add(team_sum == 1)
+        self.add_team_constraints(self.team_gs1_constraints, presolve, GS1, gs1_buckets)
 
         # Guaranteed LB or eliminated - both Grand Finalists cannot come from here
-        lb_or_eliminated_sum = 0
-        for team in self.team_guaranteed_playoff_lb_or_eliminated:
-            for i in [0, 1]:
-                lb_or_eliminated_sum += indicators[self.team_database.get_team_index(team)][i]
-        model.Add(lb_or_eliminated_sum <= 1)
+        presolve.add_sum([(FINAL, self.team_database.get_team_index(team), b)
+                          for team in self.team_guaranteed_playoff_lb_or_eliminated
+                          for b in self.buckets_between(final_buckets, 0, 1)], 0, 1)
+
+        presolve.run()
+
+        # x variable
+        indicators: [[BooleanVar]] = presolve.indicators(model, FINAL, f'x_{self.name}')
+        gs1_indicators: [[BooleanVar]] = presolve.indicators(model, GS1, f'x_{self.name}_gs1')
+        gs2_indicators = None
+        if gs2_buckets is not None:
+            gs2_indicators = presolve.indicators(model, GS2, f'x_{self.name}_gs2')
+        presolve.add_to(model, [indicators, gs1_indicators] + ([] if gs2_indicators is None else [gs2_indicators]))
+
+        # Points
+        # Overall
+        # d variable, as a weighted sum of the indicators rather than a variable of its own, so it takes exactly the
+        # point values of the buckets left open to each team
+        obtained_points: [LinearExprT] = self.obtained_points(indicators, final_buckets)
+        gs1_obtained_points: [LinearExprT] = self.obtained_points(gs1_indicators, gs1_buckets)
+        gs2_obtained_points = None if gs2_indicators is None else self.obtained_points(gs2_indicators, gs2_buckets)
 
         points_scoring_phases = 1
         if self.gs1_team_count is not None:
@@ -147,163 +161,266 @@ class SolvedTournament:
             points_scoring_phases=points_scoring_phases,
             indicators=indicators,
             points=obtained_points,
+            buckets=final_buckets,
             gs1_indicators=gs1_indicators,
             gs1_points=gs1_obtained_points,
+            gs1_buckets=gs1_buckets,
             gs2_indicators=gs2_indicators,
-            gs2_points=gs2_obtained_points
+            gs2_points=gs2_obtained_points,
+            gs2_buckets=gs2_buckets
         )
 
-    def setup_2_group_stage_tournament(self, gs1_indicators, gs2_indicators, indicators, model):
-        # Anyone who finished bottom half in GS 1 (e.g. 8-16) cannot be in GS2
-        for team in self.team_database.get_all_teams():
+    def obtained_points(self, indicators: [[BooleanVar]], buckets: [PlacementBucket]) -> [LinearExprT]:
+        return [sum(indicators[team_index][b] * buckets[b].points for b in range(len(buckets)))
+                for team_index in range(len(self.team_database.get_all_teams()))]
+
+    def setup_2_group_stage_tournament(self, presolve: Presolve, final_buckets, gs1_buckets, gs2_buckets):
+        # Only the top half of GS1 (e.g. 1-8) goes on to GS2. A team finishes GS1 at most once, so as many GS2
+        # placements as top half GS1 placements says as much without flags for qualifying or either half
+        gs1_top_buckets = self.buckets_between(gs1_buckets, 0, self.gs1_team_count - 1)
+        for team in self.participating_teams():
             team_index = self.team_database.get_team_index(team)
-            qualified_for_tournament = model.new_bool_var(f"{self.name}_{team_index}_qualified_for_tournament")
-            model.Add(sum(indicators[team_index]) == 1).only_enforce_if(qualified_for_tournament)
-            model.Add(sum(indicators[team_index]) == 0).only_enforce_if(qualified_for_tournament.Not())
-
-            gs1_top = model.new_bool_var(f"{self.name}_{team_index}_gs1_top")
-            model.Add(sum(gs1_indicators[team_index][0:self.gs1_team_count]) == 1).only_enforce_if(gs1_top)
-            model.Add(sum(gs1_indicators[team_index][0:self.gs1_team_count]) == 0).only_enforce_if(gs1_top.Not())
-
-            gs1_bottom = model.new_bool_var(f"{self.name}_{team_index}_gs1_bottom")
-            model.Add(sum(gs1_indicators[team_index][self.gs1_team_count:self.team_count]) == 1).only_enforce_if(
-                gs1_bottom)
-            model.Add(sum(gs1_indicators[team_index][self.gs1_team_count:self.team_count]) == 0).only_enforce_if(
-                gs1_bottom.Not())
-
-            not_qualified_or_gs1_bottom = model.new_bool_var(f"{self.name}_{team_index}_not_qualified_or_gs1_bottom")
-            model.AddBoolOr([qualified_for_tournament.Not(), gs1_bottom]).only_enforce_if(not_qualified_or_gs1_bottom)
-            model.AddBoolAnd([qualified_for_tournament, gs1_bottom.Not()]).only_enforce_if(
-                not_qualified_or_gs1_bottom.Not())
-
-            model.Add(sum(gs2_indicators[team_index]) == 1).only_enforce_if(gs1_top)
-            model.Add(sum(gs2_indicators[team_index]) == 0).only_enforce_if(not_qualified_or_gs1_bottom)
+            presolve.add_same(self.cells(GS2, team_index, range(len(gs2_buckets))),
+                              self.cells(GS1, team_index, gs1_top_buckets))
         # If you finish in the top half of GS2, you finish top 4 overall
-        for team in self.team_database.get_all_teams():
+        final_playoff_buckets = self.buckets_between(final_buckets, 0, self.playoff_team_count - 1)
+        gs2_playoff_buckets = self.buckets_between(gs2_buckets, 0, self.playoff_team_count - 1)
+        for team in self.participating_teams():
             team_index = self.team_database.get_team_index(team)
-            gs2_top_4 = model.new_bool_var(f"{self.name}_{team_index}_gs2_top_4")
-            model.Add(sum(gs2_indicators[team_index][0:self.playoff_team_count]) == 1).only_enforce_if(gs2_top_4)
-            model.Add(sum(gs2_indicators[team_index][0:self.playoff_team_count]) == 0).only_enforce_if(gs2_top_4.Not())
-            model.Add(sum(indicators[team_index][0:self.playoff_team_count]) == 1).only_enforce_if(gs2_top_4)
-            model.Add(sum(indicators[team_index][0:self.playoff_team_count]) == 0).only_enforce_if(gs2_top_4.Not())
+            presolve.add_same(self.cells(GS2, team_index, gs2_playoff_buckets),
+                              self.cells(FINAL, team_index, final_playoff_buckets))
 
             # Bottom GS2 = final result
-            for placement in range(4, 8):
-                model.Add(indicators[team_index][placement] == gs2_indicators[team_index][placement])
+            for b in self.buckets_between(final_buckets, self.playoff_team_count, self.gs2_team_count - 1):
+                gs2_b = self.bucket_starting_at(gs2_buckets, final_buckets[b].best)
+                presolve.add_same([(FINAL, team_index, b)], [(GS2, team_index, gs2_b)])
 
         # GS2 constraints
-        for team_gs2_constraint in self.team_gs2_constraints:
-            team_sum = 0
-            for i in range(team_gs2_constraint.best, team_gs2_constraint.worst + 1):
-                team_sum += gs2_indicators[self.team_database.get_team_index(team_gs2_constraint.team)][i]
-            model.Add(team_sum == 1)
+        self.add_team_constraints(self.team_gs2_constraints, presolve, GS2, gs2_buckets)
 
-    def setup_group_stage_1(self, model):
+    def setup_group_stage_1(self, presolve: Presolve, buckets: [PlacementBucket]):
         # GS1
         # Assume equal groups + (A1 = 1st, B1 = 2nd, A2 = 3rd, etc.)
-        all_team_count = len(self.team_database.get_all_teams())
-        # x variable
-        gs1_indicators: [[BooleanVar]] = [
-            [model.new_bool_var(f'x_{self.name}_gs1_{i}_{j}') for j in range(self.team_count)]
-            for i in range(all_team_count)]
         if self.gs1_a_teams is None or self.gs1_b_teams is None:
             print("No GS1 teams setup.  Assuming that any team can obtain points")
-            self.basic_constraints(indicators=gs1_indicators, model=model)
+            self.basic_constraints(presolve, GS1, buckets)
         else:
             # A finishes 1st, 3rd, 5th, etc.
-            for team in self.gs1_a_teams:
-                team_index = self.team_database.get_team_index(team)
-                row_sum = 0
-                for placement in range(0, self.gs1_team_count * 2, 2):
-                    row_sum += gs1_indicators[team_index][placement]
-                model.Add(row_sum == 1)
+            a_slots = [len(range(bucket.best + bucket.best % 2, min(bucket.worst + 1, self.gs1_team_count * 2), 2))
+                       for bucket in buckets]
+            self.add_group_constraints(self.gs1_a_teams, a_slots, presolve)
 
             # B finishes 2nd, 4th, 6th, etc.
-            for team in self.gs1_b_teams:
-                team_index = self.team_database.get_team_index(team)
-                row_sum = 0
-                for placement in range(1, self.gs1_team_count * 2, 2):
-                    row_sum += gs1_indicators[team_index][placement]
-                model.Add(row_sum == 1)
+            b_slots = [len(range(bucket.best + 1 - bucket.best % 2, min(bucket.worst + 1, self.gs1_team_count * 2), 2))
+                       for bucket in buckets]
+            self.add_group_constraints(self.gs1_b_teams, b_slots, presolve)
 
             # One placement per team
-            for placement in range(self.team_count):
-                model.Add(
-                    sum(gs1_indicators[i][placement] for i in range(len(self.team_database.get_all_teams()))) == 1)
+            for b, bucket in enumerate(buckets):
+                presolve.add_sum([(GS1, i, b) for i in range(len(self.team_database.get_all_teams()))], bucket.size())
 
-        # d variable
-        gs1_obtained_points: [IntVar] = [model.new_int_var(0, 99999, f'd_{self.name}_gs1_{i}')
-                                         for i in range(all_team_count)]
-        gs1_points_extended: [int] = [0] * self.team_count
-        for p in range(self.team_count):
-            point_index = floor(p / 2)
-            if point_index < len(self.gs1_points):
-                gs1_points_extended[p] = self.gs1_points[point_index]
-        for team in self.team_database.get_all_teams():
+    def add_group_constraints(self, group_teams: [Team], slots: [int], presolve: Presolve):
+        # Each group team finishes in one of its group's slots, and no bucket takes more of the group than it has slots
+        for team in group_teams:
             team_index = self.team_database.get_team_index(team)
-            gs1_obtained_points[team_index] = sum(
-                gs1_indicators[team_index][p] * gs1_points_extended[p] for p in range(len(gs1_points_extended)))
-        return gs1_indicators, gs1_obtained_points
+            presolve.add_sum(self.cells(GS1, team_index, [b for b in range(len(slots)) if slots[b] > 0]), 1)
+        for b in range(len(slots)):
+            presolve.add_sum([(GS1, self.team_database.get_team_index(team), b) for team in group_teams], 0, slots[b])
 
-    def setup_group_stage_2(self, model):
+    def setup_group_stage_2(self, presolve: Presolve, buckets: [PlacementBucket]):
         # GS2
         all_team_count = len(self.team_database.get_all_teams())
-        # x variable
-        gs2_indicators: [[BooleanVar]] = [
-            [model.new_bool_var(f'x_{self.name}_gs2_{i}_{j}') for j in range(self.team_count)]
-            for i in range(all_team_count)]
+        scoring_buckets = self.buckets_between(buckets, 0, self.gs2_team_count - 1)
         if self.gs2_teams is None:
             print("No GS2 teams setup.  Assuming that any team can obtain points")
             # A team may qualify here (we bind GS1 and GS2 later)
-            for team in self.team_database.get_all_teams():
-                model.Add(sum(gs2_indicators[self.team_database.get_team_index(team)]) <= 1)
+            for team in self.participating_teams():
+                presolve.add_sum(self.cells(GS2, self.team_database.get_team_index(team), range(len(buckets))), 0, 1)
 
             # One placement per team
-            for placement in range(self.gs2_team_count):
-                model.Add(sum(gs2_indicators[i][placement] for i in range(all_team_count)) == 1)
+            for b in scoring_buckets:
+                presolve.add_sum([(GS2, i, b) for i in range(all_team_count)], buckets[b].size())
         else:
             # Each GS2 team finishes somewhere
             for team in self.gs2_teams:
-                model.Add(sum(gs2_indicators[self.team_database.get_team_index(team)]) == 1)
+                presolve.add_sum(self.cells(GS2, self.team_database.get_team_index(team), range(len(buckets))), 1)
 
             # One placement per team
-            for placement in range(self.gs2_team_count):
-                row_sum = 0
-                for team in self.gs2_teams:
-                    team_index = self.team_database.get_team_index(team)
-                    row_sum += gs2_indicators[team_index][placement]
-                model.Add(row_sum == 1)
+            for b in scoring_buckets:
+                presolve.add_sum([(GS2, self.team_database.get_team_index(team), b) for team in self.gs2_teams],
+                                 buckets[b].size())
 
-        # d variable
-        gs2_obtained_points: [IntVar] = [model.new_int_var(0, 99999, f'd_{self.name}_gs2_{i}')
-                                         for i in range(all_team_count)]
-        gs2_points_extended: [int] = [0] * self.team_count
-        for p in range(self.team_count):
-            if p < len(self.gs2_points):
-                gs2_points_extended[p] = self.gs2_points[p]
-        for team in self.team_database.get_all_teams():
-            team_index = self.team_database.get_team_index(team)
-            gs2_obtained_points[team_index] = sum(
-                gs2_indicators[team_index][p] * gs2_points_extended[p] for p in range(len(gs2_points_extended)))
-        return gs2_indicators, gs2_obtained_points
+    @staticmethod
+    def cells(stage: int, team_index: int, bucket_indices) -> [Cell]:
+        return [(stage, team_index, b) for b in bucket_indices]
 
-    def basic_constraints(self, indicators: [[BooleanVar]], model: CpModel):
+    def participating_teams(self) -> [Team]:
+        return [team for team in self.team_database.get_all_teams() if self.can_participate(team)]
+
+    def basic_constraints(self, presolve: Presolve, stage: int, buckets: [PlacementBucket]):
         # Each invited team finishes somewhere
         for team in self.invited_teams:
-            model.Add(sum(indicators[self.team_database.get_team_index(team)]) == 1)
+            presolve.add_sum(self.cells(stage, self.team_database.get_team_index(team), range(len(buckets))), 1)
 
         # Each qualified team finishes somewhere
         for region, regional_qualifier in self.qualifiers.items():
-            regional_sum = 0
+            regional_cells: [Cell] = []
             for team in regional_qualifier.teams:
-                team_index = self.team_database.get_team_index(team)
-                model.Add(sum(indicators[team_index]) <= 1)
-                regional_sum += sum(indicators[team_index])
-            model.Add(regional_sum == regional_qualifier.num_qualified)
+                team_cells = self.cells(stage, self.team_database.get_team_index(team), range(len(buckets)))
+                presolve.add_sum(team_cells, 0, 1)
+                regional_cells += team_cells
+            presolve.add_sum(regional_cells, regional_qualifier.num_qualified)
 
         # One placement per team
-        for placement in range(self.team_count):
-            model.Add(sum(indicators[i][placement] for i in range(len(self.team_database.get_all_teams()))) == 1)
+        for b, bucket in enumerate(buckets):
+            presolve.add_sum([(stage, i, b) for i in range(len(self.team_database.get_all_teams()))], bucket.size())
+
+    def add_team_constraints(self, team_constraints: [TeamConstraint], presolve: Presolve, stage: int,
+                             buckets: [PlacementBucket]):
+        for team_constraint in team_constraints:
+            presolve.add_sum(self.cells(stage, self.team_database.get_team_index(team_constraint.team),
+                                        self.buckets_between(buckets, team_constraint.best, team_constraint.worst)), 1)
+
+    def placement_buckets(self) -> ([PlacementBucket], [PlacementBucket], [PlacementBucket]):
+        # Placements worth the same points share one indicator column, unless a constraint needs to tell them apart
+        final_cuts = set()
+        gs1_cuts = set()
+        gs2_cuts = set()
+        for cut in [self.gs1_team_count, self.gs2_team_count, self.playoff_team_count]:
+            if cut is not None:
+                final_cuts.add(cut)
+        if len(self.team_guaranteed_playoff_lb_or_eliminated) > 0:
+            final_cuts.add(2)
+        final_cuts |= self.constraint_cuts(self.team_constraints)
+
+        gs1_cuts.add(self.gs1_team_count)
+        gs1_constraint_cuts = self.constraint_cuts(self.team_gs1_constraints)
+        gs1_cuts |= gs1_constraint_cuts
+
+        # Bottom GS1 = final result, placement for placement, so both stages must split that range identically, at
+        # every final cut (structural ones such as the playoff size included) as well as the point and constraint cuts
+        gs1_points_extended = self.gs1_points_extended()
+        bottom_gs1_cuts = {cut for cut in final_cuts | self.point_cuts(self.points) |
+                           self.point_cuts(gs1_points_extended) | gs1_constraint_cuts
+                           if cut > self.gs1_team_count}
+        final_cuts |= bottom_gs1_cuts
+        gs1_cuts |= bottom_gs1_cuts
+
+        if self.gs2_team_count is None:
+            return (self.to_buckets(self.points, final_cuts),
+                    self.to_buckets(gs1_points_extended, gs1_cuts),
+                    None)
+
+        gs2_points_extended = self.gs2_points_extended()
+        gs2_cuts |= {self.playoff_team_count, self.gs2_team_count}
+        gs2_constraint_cuts = self.constraint_cuts(self.team_gs2_constraints)
+        gs2_cuts |= gs2_constraint_cuts
+
+        # Likewise bottom GS2 = final result
+        bottom_gs2_cuts = {cut for cut in final_cuts | self.point_cuts(self.points) |
+                           self.point_cuts(gs2_points_extended) | gs2_constraint_cuts
+                           if self.playoff_team_count < cut < self.gs2_team_count}
+        final_cuts |= bottom_gs2_cuts
+        gs2_cuts |= bottom_gs2_cuts
+
+        return (self.to_buckets(self.points, final_cuts),
+                self.to_buckets(gs1_points_extended, gs1_cuts),
+                self.to_buckets(gs2_points_extended, gs2_cuts))
+
+    @staticmethod
+    def point_cuts(point_table: [int]) -> set[int]:
+        return {p for p in range(1, len(point_table)) if point_table[p] != point_table[p - 1]}
+
+    @staticmethod
+    def constraint_cuts(team_constraints: [TeamConstraint]) -> set[int]:
+        cuts = set()
+        for team_constraint in team_constraints:
+            cuts.add(team_constraint.best)
+            cuts.add(team_constraint.worst + 1)
+        return cuts
+
+    @staticmethod
+    def to_buckets(point_table: [int], cuts: set[int]) -> [PlacementBucket]:
+        inner_cuts = {cut for cut in cuts | SolvedTournament.point_cuts(point_table) if 0 < cut < len(point_table)}
+        boundaries = sorted({0, len(point_table)} | inner_cuts)
+        return [PlacementBucket(best=boundaries[i], worst=boundaries[i + 1] - 1, points=point_table[boundaries[i]])
+                for i in range(len(boundaries) - 1)]
+
+    @staticmethod
+    def buckets_between(buckets: [PlacementBucket], best: int, worst: int) -> [int]:
+        # Cuts are placed at every constrained boundary, so a range never splits a bucket
+        return [b for b, bucket in enumerate(buckets) if best <= bucket.best and bucket.worst <= worst]
+
+    @staticmethod
+    def bucket_starting_at(buckets: [PlacementBucket], best: int) -> int:
+        for b, bucket in enumerate(buckets):
+            if bucket.best == best:
+                return b
+        raise Exception(f"No bucket starts at placement {best + 1}")
+
+    def definition(self) -> dict:
+        # Everything that affects the model, as plain data; the name, link and icon are only for display
+        def team_names(teams: [Team]) -> [str]:
+            return None if teams is None else [team.name for team in teams]
+
+        return {
+            "team_count": self.team_count,
+            "gs1_team_count": self.gs1_team_count,
+            "gs2_team_count": self.gs2_team_count,
+            "playoff_team_count": self.playoff_team_count,
+            "invited_teams": team_names(self.invited_teams),
+            "qualifiers": [regional_qualifier.definition() for regional_qualifier in self.qualifiers.values()],
+            "points": self.points,
+            "gs1_points": self.gs1_points,
+            "gs2_points": self.gs2_points,
+            "gs1_a_teams": team_names(self.gs1_a_teams),
+            "gs1_b_teams": team_names(self.gs1_b_teams),
+            "gs2_teams": team_names(self.gs2_teams),
+            "team_constraints": [team_constraint.definition() for team_constraint in self.team_constraints],
+            "team_gs1_constraints": [team_constraint.definition() for team_constraint in self.team_gs1_constraints],
+            "team_gs2_constraints": [team_constraint.definition() for team_constraint in self.team_gs2_constraints],
+            "team_guaranteed_playoff_lb_or_eliminated": team_names(self.team_guaranteed_playoff_lb_or_eliminated)
+        }
+
+    def gs1_points_extended(self) -> [int]:
+        # Both groups share the GS1 table, so A1 and B1 both get the first entry, A2 and B2 the second, etc.
+        gs1_points_extended: [int] = [0] * self.team_count
+        for p in range(self.team_count):
+            point_index = floor(p / 2)
+            if point_index < len(self.gs1_points):
+                gs1_points_extended[p] = self.gs1_points[point_index]
+        return gs1_points_extended
+
+    def gs2_points_extended(self) -> [int]:
+        gs2_points_extended: [int] = [0] * self.team_count
+        for p in range(self.team_count):
+            if p < len(self.gs2_points):
+                gs2_points_extended[p] = self.gs2_points[p]
+        return gs2_points_extended
+
+    def can_participate(self, team: Team) -> bool:
+        if team in self.invited_teams:
+            return True
+        return any(team in regional_qualifier.teams for regional_qualifier in self.qualifiers.values())
+
+    def max_points_obtainable(self, team: Team) -> int:
+        # Upper bound on what a team can still score here, ignoring how the other teams finish
+        if not self.can_participate(team):
+            return 0
+
+        max_points = self.max_points_from(team, self.points, self.team_constraints)
+        if self.gs1_team_count is not None:
+            max_points += self.max_points_from(team, self.gs1_points_extended(), self.team_gs1_constraints)
+        if self.gs2_team_count is not None and (self.gs2_teams is None or team in self.gs2_teams):
+            max_points += self.max_points_from(team, self.gs2_points_extended(), self.team_gs2_constraints)
+        return max_points
+
+    @staticmethod
+    def max_points_from(team: Team, point_table: [int], constraints: [TeamConstraint]) -> int:
+        for constraint in constraints:
+            if constraint.team == team:
+                return max(point_table[constraint.best:constraint.worst + 1])
+        return max(point_table)
 
     def team_can_finish_between(self, team_name: str, best: int, worst: int):
         self.team_can_finish_between_inner(team_name, best, worst, self.team_constraints)
@@ -2,12 +2,17 @@ from teams import TeamDatabase
 
 
 class TransferWindow:
-    def __init__(self, team_database: TeamDatabase):
+    def __init__(self, team_database: TeamDatabase, title: str = None):
         self.team_database = team_database
+        # Shown when hovering over the column; defaults to naming the tournaments either side
+        self.title = title
         self.changes = [0] * len(team_database.get_all_teams())
 
     def add_change(self, team_name: str, delta: int):
         self.changes[self.team_database.get_team_index_by_team_name(team_name)] = delta
 
     def as_table(self) -> []:
-        return self.changes
\ No newline at end of file
+        return self.changes
+
+    def definition(self) -> dict:
+        return {team.name: change for team, change in zip(self.team_database.get_all_teams(), self.changes)}
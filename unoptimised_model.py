@@ -1,29 +1,43 @@
 from ortools.constraint_solver.pywrapcp import BooleanVar, IntVar
+from ortools.sat.python.cp_model import Domain, LinearExprT
 
+from placement_bucket import PlacementBucket
 from transfer_window import TransferWindow
 
 
 class UnoptimisedTournamentModel:
-    def __init__(self, icon: str, points_scoring_phases: int, indicators: [[BooleanVar]], points: [IntVar], gs1_indicators: [[BooleanVar]] = None,
-                 gs1_points: [IntVar] = None, gs2_indicators: [[BooleanVar]] = None, gs2_points: [IntVar] = None):
+    def __init__(self, icon: str, points_scoring_phases: int, indicators: [[BooleanVar]], points: [LinearExprT],
+                 buckets: [PlacementBucket], gs1_indicators: [[BooleanVar]] = None, gs1_points: [LinearExprT] = None,
+                 gs1_buckets: [PlacementBucket] = None, gs2_indicators: [[BooleanVar]] = None,
+                 gs2_points: [LinearExprT] = None, gs2_buckets: [PlacementBucket] = None):
         self.icon = icon
         self.points_scoring_phases = points_scoring_phases
+        # Indicator columns are placement buckets, not individual placements
         self.indicators = indicators
         self.points = points
+        self.buckets = buckets
         self.gs1_indicators = gs1_indicators
         self.gs1_points = gs1_points
+        self.gs1_buckets = gs1_buckets
         self.gs2_indicators = gs2_indicators
         self.gs2_points = gs2_points
+        self.gs2_buckets = gs2_buckets
+
+    def stages(self) -> [([[BooleanVar]], [LinearExprT], [PlacementBucket])]:
+        # Final placement, GS1, then GS2 if the tournament has one
+        stages = [(self.indicators, self.points, self.buckets),
+                  (self.gs1_indicators, self.gs1_points, self.gs1_buckets)]
+        if self.gs2_indicators is not None:
+            stages.append((self.gs2_indicators, self.gs2_points, self.gs2_buckets))
+        return stages
 
 
 class UnoptimisedModel:
-    def __init__(self,
-                 dreamleague_season_24: UnoptimisedTournamentModel,
-                 between_dreamleague_season_24_esl_one_bangkok: TransferWindow,
-                 esl_one_bangkok_2024: UnoptimisedTournamentModel,
-                 total_points: [IntVar], ranks: [IntVar]):
-        self.dreamleague_season_24: UnoptimisedTournamentModel = dreamleague_season_24
-        self.between_dreamleague_season_24_esl_one_bangkok = between_dreamleague_season_24_esl_one_bangkok
-        self.esl_one_bangkok_2024: UnoptimisedTournamentModel = esl_one_bangkok_2024
+    def __init__(self, events: [UnoptimisedTournamentModel | TransferWindow], total_points: [LinearExprT],
+                 total_domains: [Domain], ranks: [IntVar]):
+        # One entry per season event, in the same order as EPT.events
+        self.events = events
         self.total_points = total_points
+        # Totals each team can reach
+        self.total_domains = total_domains
         self.ranks = ranks
@@ -0,0 +1,262 @@
+import argparse
+import json
+import socketserver
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from ept import EPT
+from ept_s3 import build_season
+from exact_threshold import TooManyStates
+from placement_bucket import PlacementBucket
+from rank_encoding import RankEncoding
+from result_stream import ResultStream
+from solver_config import SolverConfig
+from threshold_search import ThresholdSearch
+from unoptimised_model import UnoptimisedTournamentModel
+
+# Stages as UnoptimisedTournamentModel.stages() lists them, and the TournamentPath field holding each one's bucket
+STAGES = ["final", "gs1", "gs2"]
+PATH_BUCKETS = ["final_bucket", "gs1_bucket", "gs2_bucket"]
+
+
+class PlacementCondition:
+    # A team finishing between best and worst (1-based, inclusive) in one stage of a tournament, as
+    # SolvedTournament.team_can_finish_between and its GS1 and GS2 versions take them
+    def __init__(self, tournament: str, team: str, best: int, worst: int = None, stage: str = "final"):
+        self.tournament = tournament
+        self.team = team
+        self.best = best
+        self.worst = best if worst is None else worst
+        self.stage = stage
+
+        if self.stage not in STAGES:
+            raise ValueError(f"Stage must be one of {', '.join(STAGES)}, not {self.stage}")
+        if not 1 <= self.best <= self.worst:
+            raise ValueError(f"Cannot finish between {self.best} and {self.worst}")
+
+    def allows(self, bucket: PlacementBucket) -> bool:
+        # Placements in one bucket are worth the same and take up the same slots, so any overlap will do here, with
+        # WhatIf.clashes checking that the teams asking for them can each still get their own
+        return bucket.best <= self.worst - 1 and self.best - 1 <= bucket.worst
+
+    def description(self) -> str:
+        placements = f"{self.best}" if self.best == self.worst else f"{self.best}-{self.worst}"
+        return f"{self.team} finishing {placements} in {self.stage} of {self.tournament}"
+
+
+class WhatIf:
+    def __init__(self, top_n: int, placements: [PlacementCondition] = None, changes: dict[str, int] = None):
+        self.top_n = top_n
+        self.placements = [] if placements is None else placements
+        # Points gained or lost by each team on top of the season, as a transfer window would
+        self.changes = {} if changes is None else changes
+
+    def clashes(self) -> [PlacementCondition]:
+        # The model holds each condition to any bucket it overlaps, so two teams can both be given 3rd through the 3-4
+        # bucket. Within one stage of a tournament each placement still goes to one team, so the teams' ranges must
+        # leave each its own placement: no run of placements wanted by more teams than it has. Returns the
+        # conditions that clash, or none if they do not
+        stages: dict[(str, str), dict[str, [PlacementCondition]]] = {}
+        for placement in self.placements:
+            stages.setdefault((placement.tournament, placement.stage), {}).setdefault(placement.team, []).append(
+                placement)
+
+        for team_placements in stages.values():
+            # (best, worst, conditions) per team, with a team's own conditions narrowed down to one range
+            ranges: [(int, int, [PlacementCondition])] = []
+            for placements in team_placements.values():
+                best = max(placement.best for placement in placements)
+                worst = min(placement.worst for placement in placements)
+                if best > worst:
+                    return placements
+                ranges.append((best, worst, placements))
+
+            for best, _, _ in ranges:
+                for _, worst, _ in ranges:
+                    within = [placements for other_best, other_worst, placements in ranges
+                              if best <= other_best and other_worst <= worst]
+                    if len(within) > worst - best + 1:
+                        return [placement for placements in within for placement in placements]
+        return []
+
+    @staticmethod
+    def from_dict(value: dict) -> 'WhatIf':
+        # e.g. {"top_n": 4, "placements": [{"tournament": "ESL One Bangkok 2024", "team": "Team Spirit", "best": 3}],
+        # "changes": {"Azure Ray": -125}}
+        top_n = int(value.get("top_n", 4))
+        if top_n < 1:
+            raise ValueError(f"top_n must be at least 1, not {top_n}")
+        return WhatIf(top_n=top_n,
+                      placements=[PlacementCondition(tournament=placement["tournament"],
+                                                     team=placement["team"],
+                                                     best=int(placement["best"]),
+                                                     worst=None if placement.get("worst") is None else
+                                                     int(placement["worst"]),
+                                                     stage=placement.get("stage", "final"))
+                                  for placement in value.get("placements", [])],
+                      changes={team_name: int(change) for team_name, change in value.get("changes", {}).items()})
+
+
+class WhatIfServer:
+    # Keeps the season, its CP-SAT template, the exact engine's paths and (with several workers) a pool of forked
+    # processes resident, so each query only narrows them down rather than building anything. Conditions become
+    # assumed literals on each solve's clone of the template, and points changes shift the totals, which the
+    # counting rank encoding compares per solve rather than in the template
+    def __init__(self, ept: EPT, workers: int = 1, solver_config: SolverConfig = None):
+        if ept.rank_encoding != RankEncoding.COUNTING:
+            raise ValueError("What-if queries need the counting rank encoding")
+        self.ept = ept
+        self.threshold_search = ThresholdSearch(ept=ept, top_n=4, workers=workers, solver_config=solver_config,
+                                                incumbent_cutoff=True)
+        self.exact_threshold = self.threshold_search.exact_threshold
+        self.threshold_search.open_pool()
+        self.tournament_models: [UnoptimisedTournamentModel] = [
+            event_model for event_model in self.threshold_search.template.unoptimised_model.events
+            if isinstance(event_model, UnoptimisedTournamentModel)]
+
+    def close(self):
+        self.threshold_search.close_pool()
+
+    def answer(self, what_if: WhatIf) -> dict:
+        start = time.perf_counter()
+        team_database = self.ept.team_database
+        changes = [0] * len(team_database.get_all_teams())
+        for team_name, change in what_if.changes.items():
+            changes[team_database.get_team_index_by_team_name(team_name)] += change
+        clashing = what_if.clashes()
+        if len(clashing) > 0:
+            raise ValueError("These cannot all happen: " + "; ".join(placement.description() for placement in clashing))
+
+        # (tournament, team, stage, allowed buckets) of every condition, and the indicators one of which must be set
+        # for those the model has not already settled
+        allowed = [self.allowed_buckets(placement) for placement in what_if.placements]
+        conditions: [[int]] = []
+        condition_placements: [PlacementCondition] = []
+        for placement, (t, i, stage, buckets) in zip(what_if.placements, allowed):
+            indicators = self.tournament_models[t].stages()[stage][0][i]
+            if any(isinstance(indicators[b], int) and indicators[b] == 1 for b in buckets):
+                continue
+            indicator_indices = [indicators[b].index for b in buckets if not isinstance(indicators[b], int)]
+            if len(indicator_indices) == 0:
+                raise ValueError(f"{placement.description()} is not possible")
+            conditions.append(indicator_indices)
+            condition_placements.append(placement)
+
+        threshold_search = self.threshold_search
+        threshold_search.top_n = what_if.top_n
+        threshold_search.conditions = conditions
+        threshold_search.changes = changes
+        threshold_search.exact_threshold = self.restricted_exact_threshold(allowed, changes)
+        # Each query gets the whole global time limit
+        threshold_search.solver_config.start()
+        if threshold_search.exact_threshold is None:
+            conflicting = self.ept.conflicting_conditions(threshold_search.template.model, conditions,
+                                                          threshold_search.solver_config)
+            if len(conflicting) > 0:
+                raise ValueError("These cannot all happen: " +
+                                 "; ".join(condition_placements[k].description() for k in conflicting))
+
+        max_result = threshold_search.best(threshold_search.run(team_database.get_all_teams()))
+        answer = {"top_n": what_if.top_n,
+                  "exact": threshold_search.exact_threshold is not None,
+                  "team": None,
+                  "threshold": None,
+                  "scenario": None}
+        if max_result is not None:
+            # Totals include the points changes, which the snapshot's columns do not
+            scenario = ResultStream.scenario(max_result)
+            for team_name, change in what_if.changes.items():
+                scenario[team_name]["total"] += change
+            answer.update({"team": max_result.team_name,
+                           "threshold": round(max_result.objective_value),
+                           "scenario": scenario})
+        answer["seconds"] = time.perf_counter() - start
+        return answer
+
+    def allowed_buckets(self, placement: PlacementCondition) -> (int, int, int, [int]):
+        tournaments = [tournament.name for tournament in self.ept.tournaments()]
+        if placement.tournament not in tournaments:
+            raise ValueError(f"No such tournament {placement.tournament}")
+        t = tournaments.index(placement.tournament)
+        i = self.ept.team_database.get_team_index_by_team_name(placement.team)
+        stage = STAGES.index(placement.stage)
+        stages = self.tournament_models[t].stages()
+        if stage >= len(stages) or stages[stage][0] is None:
+            raise ValueError(f"{placement.tournament} has no {placement.stage}")
+        return t, i, stage, [b for b, bucket in enumerate(stages[stage][2]) if placement.allows(bucket)]
+
+    def restricted_exact_threshold(self, allowed: [(int, int, int, [int])], changes: [int]):
+        # The exact engine narrowed down to the paths that meet every condition, or None if it cannot be used. Its
+        # paths have the same buckets as the template, as both come from SolvedTournament.placement_buckets
+        if self.exact_threshold is None:
+            return None
+
+        team_paths = {}
+        for t, i, stage, buckets in allowed:
+            paths = team_paths.get((t, i), self.exact_threshold.tournament_paths[t].paths[i])
+            team_paths[(t, i)] = [path for path in paths if getattr(path, PATH_BUCKETS[stage]) in buckets]
+        exact_threshold = self.exact_threshold.restricted(team_paths, changes)
+        try:
+            # If not, CP-SAT can say which conditions clash
+            return exact_threshold if exact_threshold.consistent() else None
+        except TooManyStates:
+            return None
+
+
+class WhatIfHandler(BaseHTTPRequestHandler):
+    # POST a what-if as JSON, get the threshold and its scenario back as JSON
+    def do_POST(self):
+        try:
+            what_if = WhatIf.from_dict(json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0)))))
+            status, body = 200, self.server.what_if_server.answer(what_if)
+        except (ValueError, KeyError, TypeError) as e:
+            status, body = 400, {"error": str(e)}
+        if status == 200:
+            print(f"Top {body['top_n']} threshold {body['threshold']} ({body['team']}) in {body['seconds']:.3f}s")
+
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Every query already prints its answer, and a Unix socket has no client address to log
+        pass
+
+
+class UnixHTTPServer(socketserver.UnixStreamServer):
+    pass
+
+
+def main(args: argparse.Namespace):
+    print("Loading season")
+    what_if_server = WhatIfServer(ept=build_season(RankEncoding.COUNTING), workers=args.workers,
+                                  solver_config=SolverConfig.from_args(args))
+    if args.socket is not None:
+        server = UnixHTTPServer(args.socket, WhatIfHandler)
+        print(f"Listening on {args.socket}")
+    else:
+        server = HTTPServer((args.host, args.port), WhatIfHandler)
+        print(f"Listening on http://{args.host}:{args.port}")
+    server.what_if_server = what_if_server
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        what_if_server.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer what-if threshold queries over HTTP from a resident season")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8042)
+    parser.add_argument("--socket", help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes to solve teams with when the exact engine cannot be used, kept warm")
+    SolverConfig.add_arguments(parser)
+
+    main(parser.parse_args())